@@ -17,11 +17,12 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
-    # 'rest_framework_simplejwt',
+    'rest_framework_simplejwt',
     'video_subscription',
 ]
 
 MIDDLEWARE = [
+    'video_subscription.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,18 +93,78 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Open watch sessions, one key per (user, video) watched in the last
+    # WATCH_SESSION_WINDOW. Its own cache, so response and entitlement
+    # entries don't evict them. LocMemCache is per process: with several
+    # processes, point this at a shared backend such as Redis or Memcached,
+    # or each process opens its own session for the same view.
+    'watch-sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'watch-sessions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Upper bound in seconds for a cached entitlement set; entries also expire
+# when the earliest subscription in the set ends.
+ENTITLEMENT_CACHE_TIMEOUT = 300
+
+# Upper bound in seconds for a cached API response; entries are also
+# dropped as soon as a model they are built from changes.
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Watch events are written in batches once this many are pending or this
+# many seconds passed since the last write.
+WATCH_HISTORY_BUFFER_SIZE = 100
+WATCH_HISTORY_FLUSH_INTERVAL = 5
+
+# Views of the same video by the same user less than this many seconds
+# apart are one session: one WatchHistory row and one counted view.
+WATCH_SESSION_WINDOW = 30 * 60
+
+# Raw watch events older than this many days are rolled up into daily
+# summaries by `manage.py rollup_watch_history`.
+WATCH_HISTORY_RETENTION_DAYS = 90
+
+# Write-behind for new comments and rates: queued in process and written in
+# batches by a worker thread. A request waits up to WRITE_BEHIND_PUT_TIMEOUT
+# seconds for room in a full queue, then writes its row itself.
+WRITE_BEHIND_ENABLED = False
+WRITE_BEHIND_QUEUE_SIZE = 10000
+WRITE_BEHIND_BATCH_SIZE = 500
+WRITE_BEHIND_FLUSH_INTERVAL = 1
+WRITE_BEHIND_PUT_TIMEOUT = 0.5
+
+# Fraction of requests run under cProfile; profiles of those taking at
+# least METRICS_PROFILE_SLOW_MS are written to METRICS_PROFILE_DIR.
+METRICS_PROFILE_SAMPLE_RATE = 0
+METRICS_PROFILE_SLOW_MS = 500
+METRICS_PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Seconds between reloads of the trending leaderboards from the view buckets.
+TRENDING_REFRESH_INTERVAL = 60
+
+# Written by `manage.py build_recommendations`.
+RECOMMENDATIONS_PATH = BASE_DIR / 'recommendations.bin'
+
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # AUTH_USER_MODEL = 'video_subscription.VideoUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'video_subscription.authentication.VideoUserJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication'
-        # 'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Hashes the password on every request; kept for existing clients.
+        'rest_framework.authentication.BasicAuthentication',
     ),
-    # 'DEFAULT_PAGINATION_CLASS': 'video_subscription.pagination.IdBasedCursorPagination',
-    # 'PAGE_SIZE': 10,
+    'DEFAULT_PAGINATION_CLASS': 'video_subscription.pagination.IdBasedCursorPagination',
+    'PAGE_SIZE': 10,
     # 'DEFAULT_THROTTLE_RATES': {
     #     'anon': '5/minute',
     #     'user': '10/minute',
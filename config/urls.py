@@ -2,7 +2,9 @@ from django.contrib import admin
 from django.urls import path, include
 from video_subscription.views import *
 from video_subscription.viewsets import *
+from video_subscription import async_views
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 
 router = DefaultRouter()
@@ -20,10 +22,21 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     path('api/', include(router.urls)),
 
+    path('api/async/videos/', async_views.video_list, name='async-video-list'),
+    path('api/async/videos/<int:pk>/', async_views.video_detail, name='async-video-detail'),
+    path('api/async/videos/<int:pk>/get_views/', async_views.video_views, name='async-video-views'),
+    path('api/async/videos/<int:pk>/get_comments/', async_views.video_comments, name='async-video-comments'),
+    path('api/async/videos/<int:pk>/get_rates/', async_views.video_rates, name='async-video-rates'),
+    path('api/async/watch-history/', async_views.watch_history_list, name='async-watch-history'),
+
     path('api/signup/', SignUpView.as_view(), name='auth_signup'),
+    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/profile/', ProfileListView.as_view(), name='profile'),
     path('api/profile/<int:pk>/', ProfileDetailView.as_view(), name='profile-detail'),
     path('api/profile/<int:pk>/add_balance/', ProfileAddBalanceView.as_view(), name='profile-add-balance'),
+    path('api/cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VideoSubscriptionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'video_subscription'
+
+    def ready(self):
+        from . import entitlements, response_cache, search
@@ -0,0 +1,120 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from .authentication import VideoUserJWTAuthentication
+from .entitlements import aget_licensed_user_ids
+from .models import Comment, Rate, Video, VideoUser, WatchHistory, WatchHistoryDaily
+from .pagination import IdBasedCursorPagination, TrailingCursorPagination
+from .serializers import CommentSerializer, RateSerializer, VideoSerializer, WatchHistorySerializer
+from .viewsets import VideoViewSet, WatchHistoryViewSet
+from .watch_buffer import buffer as watch_buffer
+
+
+
+# Async versions of the hot read endpoints, for deployments served through
+# config.asgi. They use the same querysets, paginator and serializers as the
+# DRF viewsets, but only the async ORM API, so a request waiting on the
+# database doesn't hold a thread. JWT and session authentication are
+# supported.
+
+
+async def get_video_user(request):
+    # None without valid credentials; PermissionDenied, like HasVideoUser,
+    # for an account without a VideoUser.
+    try:
+        result = await VideoUserJWTAuthentication().aauthenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    if result is not None:
+        try:
+            return result[0].videouser
+        except VideoUser.DoesNotExist:
+            raise PermissionDenied()
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None
+    video_user = await VideoUser.objects.filter(user=user).afirst()
+    if video_user is None:
+        raise PermissionDenied()
+    return video_user
+
+
+def authenticated(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await get_video_user(request)
+            if user is None:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+            return await view(request, user, *args, **kwargs)
+        except PermissionDenied as exc:
+            return JsonResponse({'detail': str(exc.detail)}, status=403)
+        except NotFound as exc:
+            return JsonResponse({'detail': str(exc.detail)}, status=404)
+        except Video.DoesNotExist:
+            return JsonResponse({'detail': 'No Video matches the given query.'}, status=404)
+    return require_GET(wrapper)
+
+
+async def get_videos(user):
+    licensed_users = await aget_licensed_user_ids(user)
+    return Video.objects.filter(user__in=licensed_users, is_hide=False).select_related(
+        *VideoViewSet.select_related_fields
+    )
+
+
+async def paginate(request, queryset, serializer_class, view, paginator=None):
+    paginator = paginator or IdBasedCursorPagination()
+    page = await paginator.apaginate_queryset(queryset, request, view)
+    serializer = serializer_class(page, many=True, context={'request': request})
+    return JsonResponse(paginator.get_paginated_data(serializer.data))
+
+
+@authenticated
+async def video_list(request, user):
+    return await paginate(request, await get_videos(user), VideoSerializer, VideoViewSet)
+
+
+@authenticated
+async def video_detail(request, user, pk):
+    video = await (await get_videos(user)).aget(pk=pk)
+    await sync_to_async(watch_buffer.add)(user, video)
+    # Same validators as VideoViewSet.retrieve.
+    view = VideoViewSet()
+    extra = ','.join(map(str, await aget_licensed_user_ids(user)))
+    etag, last_modified = view.get_object_validators(request, video, extra)
+    response = view.get_not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    serializer = VideoSerializer(video, context={'request': request})
+    return view.set_validators(JsonResponse(serializer.data), etag, last_modified)
+
+
+@authenticated
+async def video_views(request, user, pk):
+    video = await Video.objects.only('views_count').aget(pk=pk)
+    return JsonResponse({'views': video.views_count + watch_buffer.pending(video.pk)})
+
+
+@authenticated
+async def video_comments(request, user, pk):
+    video = await Video.objects.only('pk').aget(pk=pk)
+    return await paginate(request, Comment.objects.filter(video=video), CommentSerializer, VideoViewSet)
+
+
+@authenticated
+async def video_rates(request, user, pk):
+    video = await Video.objects.only('pk').aget(pk=pk)
+    return await paginate(request, Rate.objects.filter(video=video), RateSerializer, VideoViewSet)
+
+
+@authenticated
+async def watch_history_list(request, user):
+    await sync_to_async(watch_buffer.flush)()
+    queryset = WatchHistory.objects.filter(user=user)
+    paginator = TrailingCursorPagination(WatchHistoryDaily.objects.filter(user=user))
+    return await paginate(request, queryset, WatchHistorySerializer, WatchHistoryViewSet, paginator)
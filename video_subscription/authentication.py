@@ -0,0 +1,58 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+
+class VideoUserJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that loads `user.videouser` in the same query as the
+    user, since nearly every view reads `request.user.videouser`.
+    """
+
+    def get_user_queryset(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        return self.user_model.objects.select_related('videouser').filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        )
+
+    def check_user(self, user, validated_token):
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+    def get_user(self, validated_token):
+        user = self.get_user_queryset(validated_token).first()
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        # Same as authenticate(), for plain Django async views.
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = await self.get_user_queryset(validated_token).afirst()
+        return self.check_user(user, validated_token), validated_token
@@ -0,0 +1,146 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Comment, License, Rate, RateSummary, Subscription, Video, VideoUser, WatchHistory
+
+
+
+@contextmanager
+def rollback():
+    # Benchmarks seed their own rows and discard them afterwards.
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def timed(func, repeat=5):
+    # Best wall time of `repeat` calls, in milliseconds.
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def create_users(count, prefix='bench', balance=0):
+    # Looked up by the exact usernames, so existing accounts that share the
+    # prefix are never given a VideoUser.
+    usernames = [f'{prefix}{i}' for i in range(count)]
+    User.objects.bulk_create([User(username=username) for username in usernames])
+    users = User.objects.filter(username__in=usernames).order_by('pk')
+    VideoUser.objects.bulk_create([VideoUser(user=user, phone='0', balance=balance) for user in users])
+    return list(VideoUser.objects.filter(user__in=users).select_related('user').order_by('pk'))
+
+
+def seed_catalog(publishers=100, viewers=1000, videos=20, subscriptions=5,
+                 watches=100000, comments=20000, rates=20000, prefix='bench', seed=0):
+    """
+    Bulk-create a synthetic catalog: `publishers` each with one license and
+    `videos` videos, `viewers` each subscribed to `subscriptions` publishers,
+    and random watch history, comments and rates on the subscribed videos.
+    """
+    rng = random.Random(seed)
+    publisher_users = create_users(publishers, prefix=f'{prefix}-pub-')
+    viewer_users = create_users(viewers, prefix=f'{prefix}-viewer-', balance=999)
+
+    License.objects.bulk_create([
+        License(user=user, title=f'{user.user.username} license', duration=30, price=1)
+        for user in publisher_users
+    ])
+    licenses = list(License.objects.filter(user__in=publisher_users).order_by('pk'))
+    categories = ['music', 'sports', 'news', 'gaming', 'education', 'comedy', 'travel', 'food']
+    Video.objects.bulk_create([
+        Video(
+            user=user, title=f'{rng.choice(categories)} video {i} by {user.user.username}',
+            description=' '.join(rng.choice(categories) for _ in range(12)),
+            category=rng.choice(categories), is_hide=rng.random() < 0.05,
+        )
+        for user in publisher_users for i in range(videos)
+    ], batch_size=1000)
+    video_ids = {}
+    for video_id, user_id in Video.objects.filter(user__in=publisher_users).values_list('pk', 'user'):
+        video_ids.setdefault(user_id, []).append(video_id)
+
+    today = date.today()
+    subscribed = {}
+    rows = []
+    for viewer in viewer_users:
+        picked = rng.sample(licenses, min(subscriptions, len(licenses)))
+        subscribed[viewer.pk] = [license.user_id for license in picked]
+        for license in picked:
+            start = today - timedelta(days=rng.randint(0, 60))
+            end = start + timedelta(days=license.duration)
+            rows.append(Subscription(
+                user=viewer, license=license, duration=license.duration,
+                start_date=start, end_date=end, is_active=end >= today,
+            ))
+    # bulk_create stamps today over start_date (auto_now_add); bulk_update doesn't.
+    starts = [row.start_date for row in rows]
+    Subscription.objects.bulk_create(rows, batch_size=1000)
+    for row, start in zip(rows, starts):
+        row.start_date = start
+    Subscription.objects.bulk_update(rows, ['start_date'], batch_size=1000)
+
+    def events(count):
+        for _ in range(count):
+            viewer = rng.choice(viewer_users)
+            yield viewer, rng.choice(video_ids[rng.choice(subscribed[viewer.pk])])
+
+    now = timezone.now()
+    history = [
+        WatchHistory(user=viewer, video_id=video_id, watched_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)))
+        for viewer, video_id in events(watches)
+    ]
+    for event in history:
+        event.last_watched_at = event.watched_at
+    WatchHistory.objects.bulk_create(history, batch_size=1000)
+    Comment.objects.bulk_create([
+        Comment(user=viewer, video_id=video_id, text='synthetic comment')
+        for viewer, video_id in events(comments)
+    ], batch_size=1000)
+    Rate.objects.bulk_create([
+        Rate(user=viewer, video_id=video_id, rate=rng.randint(0, 5))
+        for viewer, video_id in events(rates)
+    ], batch_size=1000, ignore_conflicts=True)
+
+    return {'publishers': publisher_users, 'viewers': viewer_users, 'licenses': licenses}
+
+
+def derive_catalog(publishers):
+    """
+    Fill what seed_catalog's bulk inserts skip for the videos of
+    `publishers`: rate summaries, view counts, the trending buckets of the
+    last week, facets and the search index.
+    """
+    from . import facets, search
+    from .trending import trending
+
+    videos = Video.objects.filter(user__in=publishers)
+    RateSummary.rebuild(videos)
+
+    views = WatchHistory.objects.filter(video=OuterRef('pk')).values('video').annotate(c=Count('pk')).values('c')
+    videos.update(views_count=Coalesce(Subquery(views), 0))
+
+    recent = WatchHistory.objects.filter(video__in=videos, watched_at__gte=timezone.now() - timedelta(days=7))
+    events = list(recent.values_list('video', 'watched_at'))
+    for i in range(0, len(events), 10000):
+        trending.record(events[i:i + 10000])
+
+    facets.rebuild()
+    if search.is_available():
+        search.rebuild()
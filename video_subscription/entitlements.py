@@ -0,0 +1,88 @@
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from .models import Subscription, VideoUser
+
+
+
+CACHE_KEY = 'entitlements:{}'
+
+stats = {'hits': 0, 'misses': 0}
+
+
+def get_licensed_users(user:VideoUser):
+    # Publishers the user can currently watch, as a subquery so the video
+    # feed is resolved in a single SQL statement.
+    return Subscription.objects.active().filter(user=user).values('license__user')
+
+
+def get_licensed_user_ids(user:VideoUser):
+    key = CACHE_KEY.format(user.pk)
+    user_ids = cache.get(key)
+    if user_ids is not None:
+        stats['hits'] += 1
+        return user_ids
+
+    stats['misses'] += 1
+    rows = get_licensed_users(user).values_list('license__user', 'end_date')
+    user_ids = sorted({user_id for user_id, end_date in rows})
+    cache.set(key, user_ids, get_timeout([end_date for user_id, end_date in rows]))
+    return user_ids
+
+
+async def aget_licensed_user_ids(user:VideoUser):
+    key = CACHE_KEY.format(user.pk)
+    user_ids = await cache.aget(key)
+    if user_ids is not None:
+        stats['hits'] += 1
+        return user_ids
+
+    stats['misses'] += 1
+    rows = [row async for row in get_licensed_users(user).values_list('license__user', 'end_date')]
+    user_ids = sorted({user_id for user_id, end_date in rows})
+    await cache.aset(key, user_ids, get_timeout([end_date for user_id, end_date in rows]))
+    return user_ids
+
+
+def get_timeout(end_dates):
+    # A subscription is active through its end_date, so the entry must not
+    # outlive the first midnight after the earliest one.
+    timeout = getattr(settings, 'ENTITLEMENT_CACHE_TIMEOUT', 300)
+    if end_dates:
+        expires = datetime.combine(min(end_dates) + timedelta(days=1), time.min)
+        timeout = min(timeout, max(int((expires - datetime.now()).total_seconds()), 1))
+    return timeout
+
+
+def invalidate_entitlements(user:VideoUser):
+    delete_entry(user.pk)
+
+
+def delete_entry(user_id):
+    # Dropped now for reads in the same transaction, and again on commit so
+    # a concurrent request can't cache the rows from before the commit.
+    key = CACHE_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def subscription_changed(sender, instance, **kwargs):
+    # Also sent for subscriptions removed by cascade, e.g. with their
+    # license. bulk_create and bulk_update send nothing; callers of those
+    # invalidate by hand.
+    delete_entry(instance.user_id)
+
+
+post_save.connect(subscription_changed, sender=Subscription, dispatch_uid='entitlements-subscription')
+post_delete.connect(subscription_changed, sender=Subscription, dispatch_uid='entitlements-subscription-delete')
+
+
+def get_stats():
+    lookups = stats['hits'] + stats['misses']
+    return {
+        'hits': stats['hits'],
+        'misses': stats['misses'],
+        'hit_ratio': stats['hits'] / lookups if lookups else 0.0,
+    }
@@ -0,0 +1,56 @@
+import decimal
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+
+# Streaming exports. Rows are read with .values().iterator() and written a
+# chunk at a time, so memory does not grow with the number of rows.
+
+CHUNK_SIZE = 1000
+
+LAYOUTS = {
+    'ndjson': 'application/x-ndjson',
+    'array': 'application/json',
+}
+
+
+class ExportEncoder(JSONEncoder):
+    def default(self, obj):
+        # Money as a string, like the API's DecimalFields.
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+def get_lines(queryset, fields, chunk_size):
+    encode = ExportEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    chunk = []
+    for row in queryset.values(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(encode(row))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_ndjson(queryset, fields, chunk_size=CHUNK_SIZE):
+    for chunk in get_lines(queryset, fields, chunk_size):
+        yield '\n'.join(chunk) + '\n'
+
+
+def stream_array(queryset, fields, chunk_size=CHUNK_SIZE):
+    separator = '['
+    for chunk in get_lines(queryset, fields, chunk_size):
+        yield separator + ','.join(chunk)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+def export_response(queryset, fields, filename, layout='ndjson'):
+    stream = stream_array if layout == 'array' else stream_ndjson
+    extension = 'json' if layout == 'array' else 'ndjson'
+    response = StreamingHttpResponse(stream(queryset, fields), content_type=LAYOUTS[layout])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import Count, F
+from .models import Video, VideoFacet
+
+
+
+# Per-publisher, per-category counts of visible videos, kept up to date by
+# ManageVideoViewSet so the facets endpoint never groups over Video.
+
+
+def adjust(user_id, category, delta):
+    facets = VideoFacet.objects.filter(user_id=user_id, category=category)
+    if delta < 0:
+        # Videos written outside ManageVideoViewSet (admin, shell, bulk
+        # loads) may have no facet row or a count already at 0; the count
+        # never goes below 0. `rebuild_facets` repairs such drift.
+        facets.filter(count__gte=-delta).update(count=F('count') + delta)
+        return
+    VideoFacet.objects.get_or_create(user_id=user_id, category=category)
+    facets.update(count=F('count') + delta)
+
+
+def video_added(video:Video):
+    if not video.is_hide:
+        adjust(video.user_id, video.category, 1)
+
+
+def video_removed(video:Video):
+    if not video.is_hide:
+        adjust(video.user_id, video.category, -1)
+
+
+def video_changed(category, is_hide, video:Video):
+    # `category` and `is_hide` are the values before the update.
+    if (category, is_hide) == (video.category, video.is_hide):
+        return
+    if not is_hide:
+        adjust(video.user_id, category, -1)
+    video_added(video)
+
+
+def get_facets(user_ids):
+    categories, publishers = {}, {}
+    rows = VideoFacet.objects.filter(user__in=user_ids, count__gt=0).values_list(
+        'user', 'user__user__username', 'category', 'count'
+    )
+    for user_id, username, category, count in rows:
+        categories[category] = categories.get(category, 0) + count
+        publisher = publishers.setdefault(user_id, {'id': user_id, 'publisher': username, 'count': 0})
+        publisher['count'] += count
+
+    return {
+        'categories': [
+            {'category': category, 'count': count}
+            for category, count in sorted(categories.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'publishers': sorted(publishers.values(), key=lambda item: (-item['count'], item['id'])),
+    }
+
+
+def rebuild():
+    rows = Video.objects.filter(is_hide=False).values('user', 'category').annotate(count=Count('pk')).order_by()
+    with transaction.atomic():
+        VideoFacet.objects.all().delete()
+        VideoFacet.objects.bulk_create([
+            VideoFacet(user_id=row['user'], category=row['category'], count=row['count']) for row in rows
+        ], batch_size=1000)
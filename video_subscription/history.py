@@ -0,0 +1,113 @@
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import WatchHistory, WatchHistoryDaily
+
+
+
+# Raw WatchHistory rows are kept for WATCH_HISTORY_RETENTION_DAYS; older
+# rows are rolled up into one WatchHistoryDaily row per (user, video, day)
+# and deleted. Readers that need the whole history combine both.
+
+
+def get_cutoff(days, now=None):
+    # Only whole days are rolled up, so a daily row is never half raw.
+    today = timezone.localdate(now or timezone.now())
+    return timezone.make_aware(datetime.combine(today - timedelta(days=days), time.min))
+
+
+def add_daily(counts):
+    """Add {(user_id, video_id, date): (sessions, count)} to the daily summaries."""
+    if not counts:
+        return
+    table = WatchHistoryDaily._meta.db_table
+    date_field = WatchHistoryDaily._meta.get_field('date')
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (user_id, video_id, date, sessions, count) VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT (user_id, video_id, date) DO UPDATE SET '
+            f'sessions = {table}.sessions + excluded.sessions, count = {table}.count + excluded.count',
+            [
+                (user_id, video_id, date_field.get_db_prep_value(date, connection), sessions, count)
+                for (user_id, video_id, date), (sessions, count) in counts.items()
+            ],
+        )
+
+
+def archive(directory, rows):
+    # One gzip JSONL file per day; each batch is appended as a new gzip
+    # member, which gzip readers concatenate transparently.
+    days = {}
+    for row in rows:
+        days.setdefault(timezone.localdate(row['watched_at']), []).append(row)
+    os.makedirs(directory, exist_ok=True)
+    for day, day_rows in days.items():
+        path = os.path.join(directory, f'watch_history-{day.isoformat()}.jsonl.gz')
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for row in day_rows:
+                f.write(json.dumps({
+                    **row,
+                    'watched_at': row['watched_at'].isoformat(),
+                    'last_watched_at': row['last_watched_at'].isoformat(),
+                }) + '\n')
+
+
+def rollup(before, batch_size=1000, archive_dir=None):
+    """
+    Move raw rows watched before `before` into the daily summaries, one
+    short transaction per batch. Returns the number of rows moved.
+    """
+    total = 0
+    old = WatchHistory.objects.filter(watched_at__lt=before).order_by('pk')
+    while True:
+        with transaction.atomic():
+            rows = list(old.values('id', 'user', 'video', 'watched_at', 'last_watched_at', 'count')[:batch_size])
+            if not rows:
+                break
+            if archive_dir:
+                archive(archive_dir, rows)
+            counts = defaultdict(lambda: [0, 0])
+            for row in rows:
+                daily = counts[(row['user'], row['video'], timezone.localdate(row['watched_at']))]
+                daily[0] += 1
+                daily[1] += row['count']
+            add_daily(counts)
+            WatchHistory.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        total += len(rows)
+    return total
+
+
+def get_daily(user, days):
+    """Watches per (date, video) for `user` over the last `days` days, from summaries and raw rows."""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    start = timezone.make_aware(datetime.combine(since, time.min))
+    counts = Counter()
+    summaries = WatchHistoryDaily.objects.filter(user=user, date__gte=since)
+    for date, video_id, count in summaries.values_list('date', 'video', 'count'):
+        counts[(date, video_id)] += count
+    raw = (
+        WatchHistory.objects.filter(user=user, watched_at__gte=start)
+        .annotate(date=TruncDate('watched_at')).values('date', 'video').annotate(count=Sum('count'))
+    )
+    for row in raw:
+        counts[(row['date'], row['video'])] += row['count']
+    return [
+        {'date': date, 'video': video_id, 'count': count}
+        for (date, video_id), count in sorted(counts.items(), key=lambda item: (item[0][0], item[1]), reverse=True)
+    ]
+
+
+def get_recent_videos(user, limit):
+    """The last `limit` videos `user` watched, newest first."""
+    raw = WatchHistory.objects.filter(user=user).order_by('-watched_at').values_list('video', flat=True)
+    videos = list(raw[:limit])
+    if len(videos) < limit:
+        summaries = WatchHistoryDaily.objects.filter(user=user).order_by('-date').values_list('video', flat=True)
+        videos += summaries[:limit - len(videos)]
+    return videos
@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+from django.db import transaction
+from django.db.models import F
+from .entitlements import invalidate_entitlements
+from .models import BalanceEntry, License, Subscription, VideoUser
+
+
+
+class InsufficientBalance(Exception):
+    pass
+
+
+def credit(user:VideoUser, amount, kind=BalanceEntry.TOP_UP, license=None):
+    with transaction.atomic():
+        VideoUser.objects.filter(pk=user.pk).update(balance=F('balance') + amount)
+        return BalanceEntry.objects.create(user=user, kind=kind, amount=amount, license=license)
+
+
+def debit(user:VideoUser, amount, kind, license=None):
+    # The balance check and the decrement are one conditional UPDATE, so
+    # concurrent purchases can never overdraw the account.
+    with transaction.atomic():
+        updated = VideoUser.objects.filter(pk=user.pk, balance__gte=amount).update(
+            balance=F('balance') - amount
+        )
+        if not updated:
+            raise InsufficientBalance()
+        return BalanceEntry.objects.create(user=user, kind=kind, amount=-amount, license=license)
+
+
+def debit_many(user:VideoUser, items):
+    """
+    Debit several (amount, kind, license) items with one conditional
+    UPDATE for their total and one ledger entry per item.
+    """
+    total = sum(amount for amount, kind, license in items)
+    with transaction.atomic():
+        updated = VideoUser.objects.filter(pk=user.pk, balance__gte=total).update(
+            balance=F('balance') - total
+        )
+        if not updated:
+            raise InsufficientBalance()
+        return BalanceEntry.objects.bulk_create([
+            BalanceEntry(user=user, kind=kind, amount=-amount, license=license)
+            for amount, kind, license in items
+        ])
+
+
+def bulk_purchase(user:VideoUser, license_ids):
+    """
+    Buy or renew many licenses at once. Everything is validated with a
+    couple of set-based queries, the total is debited at once with a
+    ledger entry per license, and the subscriptions are written with bulk_create/bulk_update. Renewals are
+    computed from subscription rows locked in the same transaction.
+    Returns one result per requested license, in request order.
+    """
+    today = date.today()
+    licenses = License.objects.in_bulk(license_ids)
+    results, accepted = [], []
+    try:
+        with transaction.atomic():
+            # Locked until commit, so a concurrent renewal of the same
+            # subscription waits and then extends the duration written here.
+            subscriptions = {}
+            for sub in Subscription.objects.select_for_update().filter(
+                user=user, license__user__in={license.user_id for license in licenses.values()}
+            ).select_related('license').order_by('end_date'):
+                subscriptions[sub.license.user_id] = sub
+
+            to_create, to_renew, expired_publishers = [], [], set()
+            publishers = set()
+            charges = []
+            for license_id in license_ids:
+                license = licenses.get(license_id)
+                result = {'license': license_id}
+                results.append(result)
+                if license is None:
+                    result.update(status='error', detail='License not found.')
+                    continue
+                if license.user_id == user.pk:
+                    result.update(status='error', detail='You cannot purchase your license.')
+                    continue
+                if license.user_id in publishers:
+                    result.update(status='error', detail='Only one license per user can be purchased at once.')
+                    continue
+                publishers.add(license.user_id)
+
+                sub = subscriptions.get(license.user_id)
+                if sub is not None and sub.end_date >= today:
+                    if sub.license_id != license.pk:
+                        result.update(status='error', detail='You already have an active license for this user.')
+                        continue
+                    sub.duration += license.duration
+                    sub.end_date = sub.start_date + timedelta(days=sub.duration)
+                    to_renew.append(sub)
+                    charges.append((license.price, BalanceEntry.RENEWAL, license))
+                    result['status'] = 'renewed'
+                else:
+                    if sub is not None:
+                        expired_publishers.add(license.user_id)
+                    to_create.append(Subscription(
+                        user=user, license=license, duration=license.duration,
+                        end_date=today + timedelta(days=license.duration), is_active=True,
+                    ))
+                    charges.append((license.price, BalanceEntry.PURCHASE, license))
+                    result['status'] = 'purchased'
+
+            accepted = [result for result in results if result['status'] != 'error']
+            if not accepted:
+                return results
+            debit_many(user, charges)
+            Subscription.objects.filter(user=user, license__user__in=expired_publishers).delete()
+            Subscription.objects.bulk_create(to_create)
+            Subscription.objects.bulk_update(to_renew, ['duration', 'end_date'])
+            # The bulk writes send no post_save.
+            invalidate_entitlements(user)
+    except InsufficientBalance:
+        for result in accepted:
+            result.update(status='error', detail='Insufficient balance.')
+    return results
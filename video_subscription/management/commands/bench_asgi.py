@@ -0,0 +1,60 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+from django.core.management.base import BaseCommand, CommandError
+from video_subscription.benchmarks import percentile
+
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the sync (/api/...) and async (/api/async/...) read endpoints of a running '
+        'server, e.g. one started with `uvicorn config.asgi:application`.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--video', type=int, required=True, help='id of a video the user is entitled to')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def get_token(self, base):
+        body = json.dumps({'username': self.username, 'password': self.password}).encode()
+        request = Request(f'{base}/api/token/', body, {'Content-Type': 'application/json'})
+        with urlopen(request) as response:
+            return json.load(response)['access']
+
+    def fetch(self, url, token):
+        start = time.perf_counter()
+        with urlopen(Request(url, headers={'Authorization': f'Bearer {token}'})) as response:
+            response.read()
+        return (time.perf_counter() - start) * 1000
+
+    def run(self, url, token, concurrency, count):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = list(pool.map(lambda _: self.fetch(url, token), range(count)))
+        elapsed = time.perf_counter() - start
+        return count / elapsed, percentile(latencies, 50), percentile(latencies, 95)
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        self.username, self.password = options['username'], options['password']
+        try:
+            token = self.get_token(base)
+        except OSError as exc:
+            raise CommandError(f'Could not reach {base}: {exc}')
+
+        video = options['video']
+        paths = [
+            'videos/', f'videos/{video}/', f'videos/{video}/get_views/',
+            f'videos/{video}/get_comments/', f'videos/{video}/get_rates/', 'watch-history/',
+        ]
+        self.stdout.write(f'{"endpoint":<32} {"mode":<6} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9}')
+        for path in paths:
+            for mode, prefix in (('sync', '/api/'), ('async', '/api/async/')):
+                rps, p50, p95 = self.run(f'{base}{prefix}{path}', token, options['concurrency'], options['requests'])
+                self.stdout.write(f'{path:<32} {mode:<6} {rps:>9.1f} {p50:>9.2f} {p95:>9.2f}')
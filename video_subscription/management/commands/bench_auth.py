@@ -0,0 +1,42 @@
+import base64
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+from video_subscription.benchmarks import rollback
+from video_subscription.models import VideoUser
+
+
+
+class Command(BaseCommand):
+    help = 'Compare requests per second with Basic and JWT authentication.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--path', default='/api/profile/')
+
+    def run(self, client, count, path):
+        start = time.perf_counter()
+        for _ in range(count):
+            response = client.get(path)
+            assert response.status_code == 200, response.status_code
+        return count / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        count, path = options['requests'], options['path']
+        with rollback():
+            user = User.objects.create_user('bench-auth', password='bench-auth-password')
+            VideoUser.objects.create(user=user, phone='0')
+
+            client = APIClient()
+            credentials = base64.b64encode(b'bench-auth:bench-auth-password').decode()
+            client.credentials(HTTP_AUTHORIZATION=f'Basic {credentials}')
+            basic = self.run(client, count, path)
+
+            client = APIClient()
+            response = client.post('/api/token/', {'username': 'bench-auth', 'password': 'bench-auth-password'})
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+            jwt = self.run(client, count, path)
+
+        self.stdout.write(f'basic: {basic:8.1f} req/s')
+        self.stdout.write(f'jwt:   {jwt:8.1f} req/s ({jwt / basic:.1f}x)')
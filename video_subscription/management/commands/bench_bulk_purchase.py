@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+from video_subscription.benchmarks import create_users, rollback
+from video_subscription.models import License, Subscription
+
+
+
+class Command(BaseCommand):
+    help = 'Compare buying licenses one request at a time with a single bulk_buy request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--licenses', type=int, default=100)
+
+    def handle(self, *args, **options):
+        count = options['licenses']
+        with rollback():
+            publishers = create_users(count, prefix='bench-bulk-pub-')
+            buyer, = create_users(1, prefix='bench-bulk-buyer-', balance=999)
+            License.objects.bulk_create([
+                License(user=publisher, title='bench', duration=30, price='0.01') for publisher in publishers
+            ])
+            license_ids = list(License.objects.filter(user__in=publishers).values_list('pk', flat=True))
+            client = APIClient()
+            client.force_authenticate(buyer.user)
+
+            start = time.perf_counter()
+            for license_id in license_ids:
+                client.post(f'/api/licenses/{license_id}/buy_license/')
+            per_item = time.perf_counter() - start
+
+            Subscription.objects.filter(user=buyer).delete()
+
+            start = time.perf_counter()
+            response = client.post('/api/licenses/bulk_buy/', {'licenses': license_ids}, format='json')
+            bulk = time.perf_counter() - start
+            purchased = sum(result['status'] == 'purchased' for result in response.data['results'])
+
+        self.stdout.write(f'per-item: {count / per_item:10.1f} licenses/s ({per_item * 1000:.1f} ms)')
+        self.stdout.write(f'bulk:     {count / bulk:10.1f} licenses/s ({bulk * 1000:.1f} ms, {purchased} purchased)')
@@ -0,0 +1,63 @@
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from video_subscription.benchmarks import create_users, rollback
+from video_subscription.models import Comment, Video
+from video_subscription.serializers import CommentSerializer
+from video_subscription.viewsets import ManageVideoViewSet
+
+
+
+class Command(BaseCommand):
+    help = 'Measure peak memory of the streaming comment export as the row count grows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--max-growth', type=float, default=1.5,
+                            help='fail if the peak for the largest export exceeds the smallest by this factor')
+
+    def handle(self, *args, **options):
+        export = ManageVideoViewSet.as_view({'get': 'export_comments'})
+        factory = APIRequestFactory()
+        peaks = []
+        self.stdout.write(f'{"rows":>8} {"stream peak KiB":>16} {"stream s":>9} {"in-memory peak KiB":>19}')
+        for rows in sorted(options['rows']):
+            with rollback():
+                user, = create_users(1, prefix='bench-exports')
+                video = Video.objects.create(user=user, title='bench', description='', category='bench')
+                Comment.objects.bulk_create(
+                    [Comment(user=user, video=video, text=f'comment {i} ' * 5) for i in range(rows)],
+                    batch_size=1000,
+                )
+
+                def stream():
+                    request = factory.get('/api/manage/videos/export_comments/')
+                    force_authenticate(request, user=user.user)
+                    size = 0
+                    for chunk in export(request).streaming_content:
+                        size += len(chunk)
+                    return size
+
+                def in_memory():
+                    comments = Comment.objects.filter(video__user=user).order_by('pk')
+                    return len(JSONRenderer().render(CommentSerializer(comments, many=True).data))
+
+                start = time.perf_counter()
+                stream_peak = self.peak(stream)
+                elapsed = time.perf_counter() - start
+                memory_peak = self.peak(in_memory)
+            peaks.append(stream_peak)
+            self.stdout.write(f'{rows:>8} {stream_peak / 1024:>16.0f} {elapsed:>9.2f} {memory_peak / 1024:>19.0f}')
+
+        if peaks[-1] > peaks[0] * options['max_growth']:
+            raise CommandError(f'Streaming peak grew from {peaks[0]} to {peaks[-1]} bytes.')
+
+    def peak(self, func):
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
@@ -0,0 +1,63 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.db import connection
+from video_subscription.benchmarks import rollback, seed_catalog, timed
+from video_subscription.models import Comment, Rate, Subscription, Video, WatchHistory
+
+
+
+class Command(BaseCommand):
+    help = 'Seed a synthetic catalog and report query plans and timings with and without the model indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publishers', type=int, default=200)
+        parser.add_argument('--viewers', type=int, default=2000)
+        parser.add_argument('--watches', type=int, default=200000)
+
+    def get_queries(self, viewer, publisher, video):
+        licensed = Subscription.objects.filter(user=viewer, end_date__gte=date.today()).values('license__user')
+        return [
+            ('entitled feed', Video.objects.filter(user__in=licensed, is_hide=False).order_by('-created_at', '-id')[:10]),
+            ('publisher videos', Video.objects.filter(user=publisher, is_hide=False)),
+            ('active subscription', Subscription.objects.filter(user=viewer, license__user=publisher)),
+            ('subscriptions by license', Subscription.objects.filter(user=viewer, license__in=publisher.licenses.all())),
+            ('video views', WatchHistory.objects.filter(video=video)),
+            ('watch history page', WatchHistory.objects.filter(user=viewer).order_by('-watched_at', '-id')[:10]),
+            ('comments page', Comment.objects.filter(video=video).order_by('-created_at', '-id')[:10]),
+            ('rates page', Rate.objects.filter(video=video).order_by('-created_at', '-id')[:10]),
+        ]
+
+    def report(self, title, queries):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for label, queryset in queries:
+            ms = timed(lambda: list(queryset.all()))
+            self.stdout.write(f'{label:<26} {ms:>9.3f} ms')
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f'    {line}')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('EXPLAIN QUERY PLAN output is only available on SQLite.')
+            return
+
+        with rollback():
+            self.stdout.write('Seeding synthetic data...')
+            seeded = seed_catalog(
+                publishers=options['publishers'], viewers=options['viewers'],
+                watches=options['watches'], prefix='bench-indexes',
+            )
+            viewer = seeded['viewers'][0]
+            publisher = seeded['publishers'][0]
+            video = publisher.videos.first()
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            self.report('With indexes', self.get_queries(viewer, publisher, video))
+
+            with connection.cursor() as cursor:
+                for model in (Video, Subscription, WatchHistory, Comment, Rate):
+                    for index in model._meta.indexes:
+                        cursor.execute(f'DROP INDEX "{index.name}"')
+                cursor.execute('ANALYZE')
+
+            self.report('Without indexes', self.get_queries(viewer, publisher, video))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from video_subscription.benchmarks import create_users, rollback, timed
+from video_subscription.models import Comment, Video
+from video_subscription.pagination import IdBasedCursorPagination
+
+
+
+class Command(BaseCommand):
+    help = 'Compare keyset page latency with OFFSET pagination at increasing depth.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--page-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rows, page_size = options['rows'], options['page_size']
+        with rollback():
+            user, = create_users(1, prefix='bench-pagination')
+            video = Video.objects.create(user=user, title='bench', description='', category='bench')
+            Comment.objects.bulk_create(
+                [Comment(user=user, video=video, text=f'comment {i}') for i in range(rows)],
+                batch_size=1000,
+            )
+            comments = Comment.objects.filter(video=video)
+            factory = APIRequestFactory()
+
+            self.stdout.write(f'{"page":>8} {"cursor ms":>10} {"offset ms":>10}')
+            depths = [d for d in (1, 10, 100, 1000, 10000) if d * page_size <= rows]
+            cursor_url = f'/?page_size={page_size}'
+            page = 1
+            for depth in depths:
+                # Walk to the page to obtain its cursor, as a client would.
+                while page < depth:
+                    paginator = IdBasedCursorPagination()
+                    paginator.paginate_queryset(comments, Request(factory.get(cursor_url)))
+                    cursor_url = paginator.get_next_link()
+                    page += 1
+
+                def cursor_page():
+                    paginator = IdBasedCursorPagination()
+                    return paginator.paginate_queryset(comments, Request(factory.get(cursor_url)))
+
+                def offset_page():
+                    offset = (depth - 1) * page_size
+                    return list(comments.order_by('-id')[offset:offset + page_size])
+
+                self.stdout.write(f'{depth:>8} {timed(cursor_page):>10.3f} {timed(offset_page):>10.3f}')
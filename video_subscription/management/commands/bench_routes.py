@@ -0,0 +1,284 @@
+import json
+import platform
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from contextlib import nullcontext
+from urllib.parse import urlencode
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from video_subscription.benchmarks import create_users, derive_catalog, percentile, rollback, seed_catalog
+from video_subscription.entitlements import get_licensed_user_ids
+from video_subscription.models import License, Subscription, Video, VideoUser, WatchHistory
+
+
+
+# Namespaces with HTML pages rather than API routes.
+SKIPPED_NAMESPACES = ('admin', 'rest_framework')
+
+# Route name prefix -> which sample object fills its `pk`, most specific first.
+PK_SAMPLES = (
+    ('manage-video-', 'own_video'),
+    ('manage-license-', 'own_license'),
+    ('async-video-', 'video'),
+    ('video-', 'video'),
+    ('license-', 'license'),
+    ('subscription-', 'subscription'),
+    ('watchhistory-', 'watch'),
+    ('videouser-', 'other_user'),
+    ('profile-', 'profile'),
+)
+
+# Query strings for routes that need one.
+QUERY_PARAMS = {
+    'video-search': {'q': 'video'},
+}
+
+# POST-only routes that can be repeated without side effects outside the
+# benchmark's own rows; the rest (purchases, balance, sign up) are skipped.
+# They write rows, so like the staff-only routes they only run on data
+# seeded inside the rolled-back transaction.
+POST_BODIES = {
+    'video-new-comment': {'text': 'bench comment'},
+    'video-new-rate': {'rate': 3},
+}
+
+# GET routes that record a view: WatchHistory rows, views_count and
+# trending buckets, written by the watch buffer. Also only run on seeded data.
+VIEW_ROUTES = ('video-detail', 'async-video-detail')
+
+
+class Command(BaseCommand):
+    help = 'Drive every API route and report latency percentiles, queries per request and throughput as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+        parser.add_argument('--warmup', type=int, default=2, help='untimed requests per route')
+        parser.add_argument('--output', default='bench-routes.json')
+        parser.add_argument('--base-url', help='send requests to a running server instead of the test client')
+        parser.add_argument('--no-seed', action='store_true', help='use the data already in the database, e.g. from seed_data; staff-only, POST and view-recording routes are skipped')
+        parser.add_argument('--publishers', type=int, default=50)
+        parser.add_argument('--viewers', type=int, default=500)
+        parser.add_argument('--videos', type=int, default=20, help='videos per publisher')
+        parser.add_argument('--watches', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--rates', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options['base_url'] and not options['no_seed']:
+            raise CommandError('A running server cannot see rows seeded in this transaction; seed with seed_data and pass --no-seed.')
+
+        seeded = None
+        with nullcontext() if options['no_seed'] else rollback():
+            if not options['no_seed']:
+                seeded = seed_catalog(
+                    publishers=options['publishers'], viewers=options['viewers'], videos=options['videos'],
+                    subscriptions=5, watches=options['watches'], comments=options['comments'],
+                    rates=options['rates'], prefix='bench-routes',
+                )
+                derive_catalog(seeded['publishers'])
+            samples = self.get_samples(seeded)
+            results, skipped = self.run(samples, options)
+
+        report = {
+            'commit': self.get_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'target': options['base_url'] or 'test client',
+            'requests_per_route': options['requests'],
+            'routes': results,
+            'skipped': skipped,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        self.stdout.write(f'{"route":<34} {"status":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"req/s":>8}')
+        for name, result in results.items():
+            queries = '-' if result['queries'] is None else f'{result["queries"]:.1f}'
+            self.stdout.write(
+                f'{name:<34} {result["status"]:>6} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} '
+                f'{result["p99_ms"]:>8.2f} {queries:>8} {result["throughput"]:>8.1f}'
+            )
+        self.stdout.write(f'{len(skipped)} routes skipped; results written to {options["output"]}.')
+
+    def get_samples(self, seeded=None):
+        # A viewer with an active subscription, and rows they can see. With
+        # seeded data they and a dedicated staff account are benchmark rows
+        # that are rolled back afterwards; existing accounts are only read.
+        viewers = VideoUser.objects.filter(pk__in=Subscription.objects.active().values('user'))
+        if seeded is not None:
+            viewers = viewers.filter(pk__in=[viewer.pk for viewer in seeded['viewers']])
+        viewer = viewers.select_related('user').order_by('pk').first()
+        if viewer is None:
+            raise CommandError('No user with an active subscription; run seed_data first.')
+        video = Video.objects.filter(user__in=get_licensed_user_ids(viewer), is_hide=False).order_by('pk').first()
+        if video is None:
+            raise CommandError(f'{viewer} has no visible videos.')
+        publisher = video.user
+        staff = None
+        if seeded is not None:
+            staff, = create_users(1, prefix='bench-routes-staff-')
+            User.objects.filter(pk=staff.user_id).update(is_staff=True)
+        return {
+            'viewer': viewer,
+            'publisher': publisher,
+            'seeded': seeded is not None,
+            'staff': staff,
+            'video': video.pk,
+            'own_video': video.pk,
+            'own_license': License.objects.filter(user=publisher).values_list('pk', flat=True).first(),
+            'license': License.objects.exclude(user=viewer).values_list('pk', flat=True).first(),
+            'subscription': Subscription.objects.filter(user=viewer).values_list('pk', flat=True).first(),
+            'watch': WatchHistory.objects.filter(user=viewer).values_list('pk', flat=True).first(),
+            'other_user': publisher.pk,
+            'profile': viewer.pk,
+        }
+
+    def get_routes(self, patterns=None):
+        """(name, pattern) for every named API route, without format-suffix duplicates."""
+        for pattern in get_resolver().url_patterns if patterns is None else patterns:
+            if isinstance(pattern, URLResolver):
+                if pattern.namespace not in SKIPPED_NAMESPACES:
+                    yield from self.get_routes(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                if 'format' not in pattern.pattern.regex.groupindex:
+                    yield pattern.name, pattern
+
+    def get_methods(self, callback):
+        if getattr(callback, 'actions', None):
+            return list(callback.actions)
+        view_class = getattr(callback, 'view_class', None)
+        if view_class is not None:
+            return [method for method in view_class.http_method_names if method != 'options' and hasattr(view_class, method)]
+        return ['get']
+
+    def is_staff_only(self, callback):
+        view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+        permissions = getattr(view_class, 'permission_classes', ())
+        return any(issubclass(permission, IsAdminUser) for permission in permissions if isinstance(permission, type))
+
+    def get_kwargs(self, name, pattern, samples):
+        kwargs = {}
+        for key in pattern.pattern.regex.groupindex:
+            if key != 'pk':
+                return None
+            for prefix, sample in PK_SAMPLES:
+                if name.startswith(prefix):
+                    kwargs['pk'] = samples[sample]
+                    break
+            if kwargs.get('pk') is None:
+                return None
+        return kwargs
+
+    def run(self, samples, options):
+        clients = {
+            'viewer': self.get_client(samples['viewer'], options['base_url']),
+            'publisher': self.get_client(samples['publisher'], options['base_url']),
+        }
+        if samples['seeded']:
+            clients['staff'] = self.get_client(samples['staff'], options['base_url'])
+        results, skipped = {}, {}
+        seen = set()
+        for name, pattern in self.get_routes():
+            if name in seen:
+                continue
+            seen.add(name)
+            methods = self.get_methods(pattern.callback)
+            if 'get' in methods:
+                if name in VIEW_ROUTES and not samples['seeded']:
+                    skipped[name] = 'records views; only run on seeded data'
+                    continue
+                method, body = 'get', None
+            elif name in POST_BODIES and 'post' in methods:
+                if not samples['seeded']:
+                    skipped[name] = 'writes rows; only run on seeded data'
+                    continue
+                method, body = 'post', POST_BODIES[name]
+            else:
+                skipped[name] = f'only {", ".join(methods)}'
+                continue
+            staff_only = self.is_staff_only(pattern.callback)
+            if staff_only and not samples['seeded']:
+                skipped[name] = 'needs a staff account; only run on seeded data'
+                continue
+            kwargs = self.get_kwargs(name, pattern, samples)
+            if kwargs is None:
+                skipped[name] = 'no sample for its URL arguments'
+                continue
+
+            path = reverse(name, kwargs=kwargs)
+            if name in QUERY_PARAMS:
+                path = f'{path}?{urlencode(QUERY_PARAMS[name])}'
+            if staff_only:
+                send = clients['staff']
+            else:
+                send = clients['publisher' if name.startswith('manage-') else 'viewer']
+            for _ in range(options['warmup']):
+                send(method, path, body)
+            latencies, queries = [], 0
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                status, count = send(method, path, body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                queries = None if count is None else queries + count
+            results[name] = {
+                'method': method.upper(),
+                'path': path,
+                'status': status,
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'mean_ms': sum(latencies) / len(latencies),
+                'queries': None if queries is None else queries / len(latencies),
+                'throughput': len(latencies) / (sum(latencies) / 1000),
+            }
+        return results, skipped
+
+    def get_client(self, user, base_url):
+        token = str(RefreshToken.for_user(user.user).access_token)
+        if base_url:
+            return lambda method, path, body: self.send_http(base_url, token, method, path, body)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        def send(method, path, body):
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(client, method)(path, body)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return response.status_code, len(captured)
+        return send
+
+    def send_http(self, base_url, token, method, path, body):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(
+            base_url.rstrip('/') + path, data=data, method=method.upper(),
+            headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+    def get_commit(self):
+        try:
+            result = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return result.stdout.strip() or None
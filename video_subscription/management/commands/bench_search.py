@@ -0,0 +1,44 @@
+import random
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from video_subscription import search
+from video_subscription.benchmarks import percentile, rollback, seed_catalog, timed
+from video_subscription.entitlements import get_licensed_user_ids
+from video_subscription.models import Video
+
+
+
+class Command(BaseCommand):
+    help = 'Measure video search latency on a large synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publishers', type=int, default=500)
+        parser.add_argument('--videos', type=int, default=100, help='videos per publisher')
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('The full-text index is only available on SQLite.')
+
+        rng = random.Random(0)
+        terms = ['music', 'sports', 'news', 'gaming', 'education', 'comedy', 'travel', 'food', 'video']
+        with rollback():
+            seeded = seed_catalog(
+                publishers=options['publishers'], videos=options['videos'], viewers=50,
+                subscriptions=options['publishers'] // 2, watches=0, comments=0, rates=0,
+                prefix='bench-search',
+            )
+            search.rebuild()
+            catalog = Video.objects.count()
+            viewer = seeded['viewers'][0]
+            queryset = Video.objects.filter(Q(user__in=get_licensed_user_ids(viewer)) & Q(is_hide=False))
+
+            latencies = []
+            for _ in range(options['queries']):
+                text = ' '.join(rng.sample(terms, rng.randint(1, 2)))
+                latencies.append(timed(lambda: search.search(queryset, text, 20), repeat=1))
+
+        self.stdout.write(f'catalog: {catalog} videos')
+        self.stdout.write(f'p50: {percentile(latencies, 50):.2f} ms')
+        self.stdout.write(f'p95: {percentile(latencies, 95):.2f} ms')
+        self.stdout.write(f'max: {max(latencies):.2f} ms')
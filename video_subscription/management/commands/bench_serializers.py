@@ -0,0 +1,58 @@
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from video_subscription.benchmarks import derive_catalog, rollback, seed_catalog
+from video_subscription.fast_serializers import SubscriptionValuesSerializer, VideoValuesSerializer
+from video_subscription.models import Subscription, Video
+from video_subscription.serializers import SubscriptionSerializer, VideoSerializer
+
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of the .values() serializers with the DRF ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publishers', type=int, default=100)
+        parser.add_argument('--videos', type=int, default=50, help='videos per publisher')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        with rollback():
+            seeded = seed_catalog(
+                publishers=options['publishers'], videos=options['videos'], viewers=500,
+                subscriptions=10, watches=0, comments=0, rates=20000, prefix='bench-serializers',
+            )
+            derive_catalog(seeded['publishers'])
+            request = Request(APIRequestFactory().get('/api/videos/'))
+            context = {'request': request, 'format': None, 'view': None}
+
+            cases = [
+                ('video', Video.objects.select_related('user__user', 'rate_summary').order_by('-created_at', '-id'),
+                 VideoSerializer, VideoValuesSerializer),
+                ('subscription', Subscription.objects.select_related('user__user', 'license__user__user').order_by('-id'),
+                 SubscriptionSerializer, SubscriptionValuesSerializer),
+            ]
+            self.stdout.write(f'{"serializer":<14} {"rows":>7} {"drf rows/s":>12} {"values rows/s":>14} {"speedup":>8}')
+            for name, queryset, serializer_class, values_serializer_class in cases:
+                def drf():
+                    return renderer.render(serializer_class(list(queryset), many=True, context=context).data)
+
+                def values():
+                    serializer = values_serializer_class(context)
+                    return renderer.render(serializer.serialize(queryset.values(*serializer.fields)))
+
+                rows = queryset.count()
+                drf_rate, values_rate = self.rows_per_second(drf, rows, options['repeat']), self.rows_per_second(values, rows, options['repeat'])
+                self.stdout.write(f'{name:<14} {rows:>7} {drf_rate:>12.0f} {values_rate:>14.0f} {values_rate / drf_rate:>7.1f}x')
+
+    def rows_per_second(self, func, rows, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return rows / best
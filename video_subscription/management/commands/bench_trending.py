@@ -0,0 +1,55 @@
+import random
+import time
+from datetime import timedelta
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+from video_subscription.benchmarks import percentile, rollback, seed_catalog, timed
+from video_subscription.models import Video
+from video_subscription.trending import WINDOWS, Trending
+
+
+
+class Command(BaseCommand):
+    help = 'Measure view bucket ingestion throughput and trending query latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publishers', type=int, default=100)
+        parser.add_argument('--videos', type=int, default=20, help='videos per publisher')
+        parser.add_argument('--events', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with rollback():
+            seed_catalog(
+                publishers=options['publishers'], videos=options['videos'], viewers=10,
+                subscriptions=1, watches=0, comments=0, rates=0, prefix='bench-trending',
+            )
+            video_ids = list(Video.objects.values_list('pk', flat=True))
+            # A few videos get most of the views, like a real catalog.
+            weights = [1 / (rank + 1) for rank in range(len(video_ids))]
+            now = timezone.now()
+            events = [
+                (video_id, now - timedelta(seconds=rng.randint(0, 7 * 24 * 3600)))
+                for video_id in rng.choices(video_ids, weights, k=options['events'])
+            ]
+
+            trending = Trending(refresh_interval=3600)
+            size = options['batch_size']
+            start = time.perf_counter()
+            for i in range(0, len(events), size):
+                trending.record(events[i:i + size])
+            ingest = time.perf_counter() - start
+
+            load = timed(trending.load, repeat=1)
+            latencies = {window: [] for window in WINDOWS}
+            for _ in range(options['queries']):
+                for window in WINDOWS:
+                    latencies[window].append(timed(lambda: trending.top(window, 50), repeat=1))
+
+        self.stdout.write(f'catalog: {len(video_ids)} videos, {len(events)} events')
+        self.stdout.write(f'ingest: {len(events) / ingest:.0f} events/s (batches of {size})')
+        self.stdout.write(f'load: {load:.2f} ms')
+        for window, values in latencies.items():
+            self.stdout.write(f'top 50 {window}: p50 {percentile(values, 50):.3f} ms, p95 {percentile(values, 95):.3f} ms')
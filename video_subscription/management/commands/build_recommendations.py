@@ -0,0 +1,22 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from video_subscription import recommendations
+
+
+
+class Command(BaseCommand):
+    help = 'Compute the item-to-item similarity matrix used by /api/videos/recommended/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=20, help='similar videos kept per video')
+        parser.add_argument('--history', type=int, default=50, help='most recent videos used per user')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        matrix = recommendations.build(options['neighbors'], options['history'])
+        recommendations.save(matrix, settings.RECOMMENDATIONS_PATH)
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {len(matrix["indices"])} similarities for {len(matrix["videos"])} videos '
+            f'in {time.perf_counter() - start:.1f}s.'
+        ))
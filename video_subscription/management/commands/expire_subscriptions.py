@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from video_subscription.models import Subscription
+
+
+
+class Command(BaseCommand):
+    help = 'Clear is_active on subscriptions past their end_date, in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Each chunk is its own short UPDATE, so the sweep never holds a
+        # long write lock on the subscriptions table.
+        expired = Subscription.objects.expired().filter(is_active=True)
+        total = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            total += Subscription.objects.filter(pk__in=ids).update(is_active=False)
+        self.stdout.write(self.style.SUCCESS(f'Expired {total} subscriptions.'))
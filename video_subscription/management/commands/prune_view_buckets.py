@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from video_subscription.trending import prune
+
+
+
+class Command(BaseCommand):
+    help = 'Delete view buckets older than their retention period.'
+
+    def handle(self, *args, **options):
+        deleted = prune()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} view buckets.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from video_subscription import facets
+
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-publisher category counts from the Video table.'
+
+    def handle(self, *args, **options):
+        facets.rebuild()
+        self.stdout.write(self.style.SUCCESS('Rebuilt video facets.'))
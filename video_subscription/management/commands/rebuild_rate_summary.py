@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from video_subscription.models import RateSummary
+
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-video rating aggregates from the Rate table.'
+
+    def handle(self, *args, **options):
+        rebuilt = RateSummary.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rate summaries for {rebuilt} videos.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from video_subscription import search
+
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the video full-text search index from the Video table.'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('The full-text index is only available on SQLite.')
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the video search index.'))
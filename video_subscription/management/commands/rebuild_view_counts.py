@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from video_subscription.models import Video, WatchHistory, WatchHistoryDaily
+
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Video.views_count from WatchHistory and its daily summaries.'
+
+    def handle(self, *args, **options):
+        views = WatchHistory.objects.filter(video=OuterRef('pk')).values('video').annotate(c=Count('pk')).values('c')
+        rolled_up = WatchHistoryDaily.objects.filter(video=OuterRef('pk')).values('video').annotate(c=Sum('sessions')).values('c')
+        updated = Video.objects.update(
+            views_count=Coalesce(Subquery(views), 0) + Coalesce(Subquery(rolled_up), 0)
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt view counts for {updated} videos.'))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from video_subscription.history import get_cutoff, rollup
+
+
+
+class Command(BaseCommand):
+    help = 'Roll raw watch history older than the retention period into daily summaries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'WATCH_HISTORY_RETENTION_DAYS', 90))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--archive-dir', help='also append the raw rows to gzip JSONL files, one per day')
+
+    def handle(self, *args, **options):
+        cutoff = get_cutoff(options['days'])
+        total = rollup(cutoff, batch_size=options['batch_size'], archive_dir=options['archive_dir'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {total} watch events older than {cutoff:%Y-%m-%d}.'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from video_subscription.benchmarks import derive_catalog, seed_catalog
+
+
+
+class Command(BaseCommand):
+    help = 'Create a synthetic catalog with bulk inserts, for local load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publishers', type=int, default=100)
+        parser.add_argument('--viewers', type=int, default=1000)
+        parser.add_argument('--videos', type=int, default=20, help='videos per publisher')
+        parser.add_argument('--subscriptions', type=int, default=5, help='subscriptions per viewer')
+        parser.add_argument('--watches', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--rates', type=int, default=20000)
+        parser.add_argument('--prefix', default='seed', help='username prefix; must not be in use yet')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seeded = seed_catalog(
+                publishers=options['publishers'], viewers=options['viewers'], videos=options['videos'],
+                subscriptions=options['subscriptions'], watches=options['watches'],
+                comments=options['comments'], rates=options['rates'],
+                prefix=options['prefix'], seed=options['seed'],
+            )
+            derive_catalog(seeded['publishers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(seeded["publishers"])} publishers and {len(seeded["viewers"])} viewers '
+            f'with the prefix "{options["prefix"]}".'
+        ))
@@ -0,0 +1,135 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from rest_framework import serializers
+
+
+
+# In-process request metrics, filled by InstrumentationMiddleware and
+# served in the Prometheus text format by MetricsView. Histograms are
+# cumulative like Prometheus client histograms; rolling windows are taken
+# with rate() on the scraping side.
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, view, value):
+        series = self.series.get(view)
+        if series is None:
+            series = self.series.setdefault(view, Histogram(self.buckets))
+        series.observe(value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for view, series in sorted(self.series.items()):
+            label = 'view="{}"'.format(view.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            cumulative = 0
+            for bound, count in zip([*series.buckets, '+Inf'], series.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {series.sum}')
+            lines.append(f'{self.name}_count{{{label}}} {series.count}')
+        return lines
+
+
+METRICS = {
+    'wall': Metric('video_request_seconds', 'Request wall time in seconds.', SECONDS),
+    'queries': Metric('video_request_db_queries', 'Database queries per request.', QUERIES),
+    'db': Metric('video_request_db_seconds', 'Database time per request in seconds.', SECONDS),
+    'serializer': Metric('video_request_serializer_seconds', 'Serializer time per request in seconds.', SECONDS),
+}
+
+lock = threading.Lock()
+
+# The record of the request being handled, for code deep in the stack.
+current = contextvars.ContextVar('metrics_record', default=None)
+
+
+def new_record():
+    return {'queries': 0, 'db': 0.0, 'serializer': 0.0, 'depth': 0}
+
+
+def observe(view, wall, record):
+    with lock:
+        METRICS['wall'].observe(view, wall)
+        METRICS['queries'].observe(view, record['queries'])
+        METRICS['db'].observe(view, record['db'])
+        METRICS['serializer'].observe(view, record['serializer'])
+
+
+def render():
+    with lock:
+        lines = [line for metric in METRICS.values() for line in metric.render()]
+    return '\n'.join(lines) + '\n'
+
+
+def query_timer(execute, sql, params, many, context):
+    # An execute wrapper installed on every connection. The record is found
+    # through the context, which sync_to_async carries into the thread
+    # where async views run their queries.
+    record = current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if record is not None:
+            record['queries'] += 1
+            record['db'] += time.perf_counter() - start
+
+
+def install_query_timer(connection, **kwargs):
+    # A connection_created receiver.
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+@contextmanager
+def serializer_timer():
+    # Only the outermost serializer is timed; nested ones are part of it.
+    record = current.get()
+    if record is None or record['depth']:
+        yield
+        return
+    record['depth'] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['serializer'] += time.perf_counter() - start
+        record['depth'] -= 1
+
+
+def instrument_serializers():
+    """Time every top-level `serializer.data` access. Idempotent."""
+    data = serializers.BaseSerializer.data
+    if getattr(data.fget, 'instrumented', False):
+        return
+
+    def timed_data(self):
+        with serializer_timer():
+            return data.fget(self)
+    timed_data.instrumented = True
+    serializers.BaseSerializer.data = property(timed_data)
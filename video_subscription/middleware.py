@@ -0,0 +1,90 @@
+import cProfile
+import os
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from . import metrics
+
+
+
+class InstrumentationMiddleware:
+    """
+    Records wall time, query count, database time and serializer time of
+    every request under the view that handled it, e.g.
+    `VideoViewSet.get_comments`, for the metrics endpoint.
+
+    With METRICS_PROFILE_SAMPLE_RATE above 0 that fraction of sync requests
+    runs under cProfile, and the profile is written to METRICS_PROFILE_DIR
+    when the request took at least METRICS_PROFILE_SLOW_MS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, 'METRICS_PROFILE_SAMPLE_RATE', 0)
+        self.slow_ms = getattr(settings, 'METRICS_PROFILE_SLOW_MS', 500)
+        self.profile_dir = getattr(settings, 'METRICS_PROFILE_DIR', settings.BASE_DIR / 'profiles')
+        metrics.instrument_serializers()
+        connection_created.connect(metrics.install_query_timer, dispatch_uid='metrics-query-timer')
+        for connection in connections.all(initialized_only=True):
+            metrics.install_query_timer(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        record = metrics.new_record()
+        token = metrics.current.set(record)
+        profiler = cProfile.Profile() if self.sample_rate and random.random() < self.sample_rate else None
+        start = time.perf_counter()
+        try:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        finally:
+            metrics.current.reset(token)
+        wall = time.perf_counter() - start
+        view = self.get_view_name(request)
+        metrics.observe(view, wall, record)
+        if profiler is not None and wall * 1000 >= self.slow_ms:
+            self.dump(profiler, view)
+        return response
+
+    async def __acall__(self, request):
+        # cProfile only follows the calling thread, so async requests are
+        # measured but never profiled.
+        record = metrics.new_record()
+        token = metrics.current.set(record)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        metrics.observe(self.get_view_name(request), time.perf_counter() - start, record)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = self.describe(request, view_func)
+
+    def describe(self, request, view_func):
+        cls = getattr(view_func, 'cls', None)
+        if cls is None:
+            return f'{view_func.__module__}.{view_func.__name__}'
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{cls.__name__}.{action}'
+
+    def get_view_name(self, request):
+        return getattr(request, 'metrics_view', 'unresolved')
+
+    def dump(self, profiler, view):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{view}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
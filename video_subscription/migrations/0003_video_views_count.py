@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:42
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_views(apps, schema_editor):
+    Video = apps.get_model('video_subscription', 'Video')
+    WatchHistory = apps.get_model('video_subscription', 'WatchHistory')
+    views = WatchHistory.objects.filter(video=OuterRef('pk')).values('video').annotate(c=Count('pk')).values('c')
+    Video.objects.update(views_count=Coalesce(Subquery(views), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0002_comment_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='watchhistory',
+            name='watched_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(count_views, migrations.RunPython.noop),
+    ]
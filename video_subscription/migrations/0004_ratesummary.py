@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def summarize_rates(apps, schema_editor):
+    Rate = apps.get_model('video_subscription', 'Rate')
+    RateSummary = apps.get_model('video_subscription', 'RateSummary')
+    rows = Rate.objects.values('video').annotate(
+        count=Count('pk'),
+        total=Sum('rate'),
+        **{f'score_{score}': Count('pk', filter=Q(rate=score)) for score in range(6)}
+    )
+    RateSummary.objects.bulk_create([
+        RateSummary(video_id=row.pop('video'), **row) for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0003_video_views_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateSummary',
+            fields=[
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rate_summary', serialize=False, to='video_subscription.video')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('score_0', models.PositiveIntegerField(default=0)),
+                ('score_1', models.PositiveIntegerField(default=0)),
+                ('score_2', models.PositiveIntegerField(default=0)),
+                ('score_3', models.PositiveIntegerField(default=0)),
+                ('score_4', models.PositiveIntegerField(default=0)),
+                ('score_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(summarize_rates, migrations.RunPython.noop),
+    ]
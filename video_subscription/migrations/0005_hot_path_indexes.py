@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0004_ratesummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['video', '-created_at', '-id'], name='comment_video_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rate',
+            index=models.Index(fields=['video', '-created_at', '-id'], name='rate_video_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'end_date'], name='subscription_user_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'license'], name='subscription_user_license_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['user', 'is_hide'], name='video_user_hide_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(condition=models.Q(('is_hide', False)), fields=['user', '-created_at', '-id'], name='video_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchhistory',
+            index=models.Index(fields=['user', '-watched_at', '-id'], name='watchhistory_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchhistory',
+            index=models.Index(fields=['video', 'watched_at'], name='watchhistory_video_idx'),
+        ),
+    ]
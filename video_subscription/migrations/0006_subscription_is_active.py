@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:48
+
+import datetime
+from django.db import migrations, models
+
+
+def flag_expired(apps, schema_editor):
+    Subscription = apps.get_model('video_subscription', 'Subscription')
+    Subscription.objects.filter(end_date__lt=datetime.date.today()).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['end_date'], name='subscription_active_end_idx'),
+        ),
+        migrations.RunPython(flag_expired, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0006_subscription_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('top_up', 'Top up'), ('purchase', 'Purchase'), ('renewal', 'Renewal')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('license', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='video_subscription.license')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_entries', to='video_subscription.videouser')),
+            ],
+        ),
+    ]
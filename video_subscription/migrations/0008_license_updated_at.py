@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0007_balanceentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='license',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:02
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE video_subscription_video_fts "
+        "USING fts5(title, description, category, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        "INSERT INTO video_subscription_video_fts (rowid, title, description, category) "
+        "SELECT id, title, description, category FROM video_subscription_video"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE video_subscription_video_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0008_license_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
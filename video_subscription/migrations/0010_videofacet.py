@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_facets(apps, schema_editor):
+    Video = apps.get_model('video_subscription', 'Video')
+    VideoFacet = apps.get_model('video_subscription', 'VideoFacet')
+    rows = Video.objects.filter(is_hide=False).values('user', 'category').annotate(count=Count('pk')).order_by()
+    VideoFacet.objects.bulk_create([
+        VideoFacet(user_id=row['user'], category=row['category'], count=row['count']) for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0009_video_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='video_subscription.videouser')),
+            ],
+            options={
+                'unique_together': {('user', 'category')},
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0010_videofacet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='video_subscription.video')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'start'], name='viewbucket_window_idx')],
+                'unique_together': {('video', 'granularity', 'start')},
+            },
+        ),
+    ]
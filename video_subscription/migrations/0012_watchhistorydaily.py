@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0011_videoviewbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchHistoryDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='video_subscription.videouser')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='video_subscription.video')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-date'], name='watchdaily_user_date_idx')],
+                'unique_together': {('user', 'video', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_last_watched_at(apps, schema_editor):
+    WatchHistory = apps.get_model('video_subscription', 'WatchHistory')
+    WatchHistory.objects.update(last_watched_at=models.F('watched_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0012_watchhistorydaily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='watchhistory',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='watchhistory',
+            name='last_watched_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_watched_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+def backfill_sessions(apps, schema_editor):
+    # Until now the rollup stored one count per raw row, i.e. sessions.
+    WatchHistoryDaily = apps.get_model('video_subscription', 'WatchHistoryDaily')
+    WatchHistoryDaily.objects.update(sessions=models.F('count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_subscription', '0013_watchhistory_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='watchhistorydaily',
+            name='sessions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_sessions, migrations.RunPython.noop),
+    ]
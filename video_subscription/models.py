@@ -1,6 +1,9 @@
 from datetime import timedelta,datetime
-from django.db import models
+from collections import Counter
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 
@@ -19,12 +22,21 @@ class License(models.Model):
     title = models.CharField(max_length=255)
     duration = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return self.user.user.username + " - " + self.title
 
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(end_date__gte=datetime.today().date())
+
+    def expired(self):
+        return self.filter(end_date__lt=datetime.today().date())
+
+
 class Subscription(models.Model):
     user = models.ForeignKey(VideoUser, on_delete=models.CASCADE, related_name='subscriptions')
     license = models.ForeignKey(License, on_delete=models.CASCADE, related_name='licensed')
@@ -33,16 +45,23 @@ class Subscription(models.Model):
     end_date   = models.DateField(null=True, blank=True)
     is_active  = models.BooleanField(default=True)
 
-    def is_active(self):
-        # return False
-        if datetime.today().date() > self.end_date:
-            return False
-        return True
+    objects = SubscriptionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'end_date'], name='subscription_user_end_idx'),
+            models.Index(fields=['user', 'license'], name='subscription_user_license_idx'),
+            models.Index(
+                fields=['end_date'], name='subscription_active_end_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.start_date:
             self.start_date = datetime.today().date()
         self.end_date = self.start_date + timedelta(days=self.duration)
+        self.is_active = self.end_date >= datetime.today().date()
         super().save(*args, **kwargs)
 
     def __str__(self) -> str:
@@ -50,6 +69,27 @@ class Subscription(models.Model):
 
 
 
+class BalanceEntry(models.Model):
+    TOP_UP = 'top_up'
+    PURCHASE = 'purchase'
+    RENEWAL = 'renewal'
+    KIND_CHOICES = [
+        (TOP_UP, 'Top up'),
+        (PURCHASE, 'Purchase'),
+        (RENEWAL, 'Renewal'),
+    ]
+
+    user = models.ForeignKey(VideoUser, on_delete=models.CASCADE, related_name='balance_entries')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    license = models.ForeignKey(License, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.user.__str__() + " - " + self.kind + " " + str(self.amount)
+
+
+
 class Video(models.Model):
     user = models.ForeignKey(VideoUser, on_delete=models.CASCADE, related_name='videos')
     title = models.CharField(max_length=255)
@@ -59,34 +99,187 @@ class Video(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_hide = models.BooleanField(default=False)
+    views_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_hide'], name='video_user_hide_idx'),
+            models.Index(
+                fields=['user', '-created_at', '-id'], name='video_visible_idx',
+                condition=models.Q(is_hide=False),
+            ),
+        ]
 
     def __str__(self):
         return self.user.__str__()+" - "+self.title
 
 
 
+class VideoFacet(models.Model):
+    user = models.ForeignKey(VideoUser, on_delete=models.CASCADE, related_name='facets')
+    category = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'category')
+
+    def __str__(self):
+        return self.user.__str__()+" - "+self.category
+
+
+
 class WatchHistory(models.Model):
     user = models.ForeignKey(VideoUser, on_delete=models.CASCADE)
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
-    watched_at = models.DateTimeField(auto_now_add=True)
+    # One row per viewing session: refreshes within WATCH_SESSION_WINDOW
+    # move last_watched_at and bump count instead of adding rows.
+    watched_at = models.DateTimeField(default=timezone.now)
+    last_watched_at = models.DateTimeField(default=timezone.now)
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-watched_at', '-id'], name='watchhistory_user_idx'),
+            models.Index(fields=['video', 'watched_at'], name='watchhistory_video_idx'),
+        ]
 
     def __str__(self):
         return self.user.__str__()+" - "+self.video.title
 
 
 
+class WatchHistoryDaily(models.Model):
+    # Raw WatchHistory rows older than the retention period, rolled up per day.
+    user = models.ForeignKey(VideoUser, on_delete=models.CASCADE)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    date = models.DateField()
+    # Watches including session refreshes, like WatchHistory.count, and
+    # the number of raw rows, i.e. counted views.
+    count = models.PositiveIntegerField(default=0)
+    sessions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'video', 'date')
+        indexes = [
+            models.Index(fields=['user', '-date'], name='watchdaily_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return self.user.__str__()+" - "+self.video.title+" "+str(self.date)
+
+
+
+class VideoViewBucket(models.Model):
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [
+        (MINUTE, 'Minute'),
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='view_buckets')
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('video', 'granularity', 'start')
+        indexes = [
+            models.Index(fields=['granularity', 'start'], name='viewbucket_window_idx'),
+        ]
+
+    def __str__(self):
+        return self.video.__str__()+" - "+self.granularity+" "+str(self.start)
+
+
+
 class Comment(models.Model):
     user = models.ForeignKey(VideoUser, on_delete=models.CASCADE)
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, which bulk_create would restamp: rows from the
+    # write-behind queue keep the time the request made them.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     text = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['video', '-created_at', '-id'], name='comment_video_idx'),
+        ]
+
 
 class Rate(models.Model):
     user = models.ForeignKey(VideoUser, on_delete=models.CASCADE)
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # See Comment.created_at.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     rate = models.PositiveIntegerField()
 
     class Meta:
         unique_together = ('user', 'video')
+        indexes = [
+            models.Index(fields=['video', '-created_at', '-id'], name='rate_video_idx'),
+        ]
+
+
+class RateSummary(models.Model):
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, primary_key=True, related_name='rate_summary')
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    score_0 = models.PositiveIntegerField(default=0)
+    score_1 = models.PositiveIntegerField(default=0)
+    score_2 = models.PositiveIntegerField(default=0)
+    score_3 = models.PositiveIntegerField(default=0)
+    score_4 = models.PositiveIntegerField(default=0)
+    score_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def average(self):
+        if not self.count:
+            return None
+        return round(self.total / self.count, 2)
+
+    @property
+    def histogram(self):
+        return {str(score): getattr(self, f'score_{score}') for score in range(6)}
+
+    @classmethod
+    def add(cls, video_id, rates):
+        # Must run inside the transaction that inserts the Rate rows.
+        scores = Counter(rates)
+        cls.objects.get_or_create(video_id=video_id)
+        cls.objects.filter(video_id=video_id).update(
+            count=F('count') + sum(scores.values()),
+            total=F('total') + sum(score * n for score, n in scores.items()),
+            updated_at=timezone.now(),
+            **{f'score_{score}': F(f'score_{score}') + n for score, n in scores.items()}
+        )
+
+    @classmethod
+    def rebuild(cls, videos=None):
+        """
+        Recompute the summaries of `videos` (all videos by default) from
+        Rate, e.g. after rates were removed by a cascading delete.
+        Returns the number of summaries written.
+        """
+        rates = Rate.objects.all()
+        summaries = cls.objects.all()
+        if videos is not None:
+            rates = rates.filter(video__in=videos)
+            summaries = summaries.filter(video__in=videos)
+        rows = rates.values('video').annotate(
+            count=Count('pk'),
+            total=Sum('rate'),
+            **{f'score_{score}': Count('pk', filter=Q(rate=score)) for score in range(6)}
+        ).order_by()
+        with transaction.atomic():
+            summaries.delete()
+            created = cls.objects.bulk_create(
+                [cls(video_id=row.pop('video'), **row) for row in rows], batch_size=1000
+            )
+        return len(created)
+
+    def __str__(self):
+        return self.video.__str__()
@@ -0,0 +1,228 @@
+import base64
+import datetime
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder drops microseconds, which would skip rows that
+        # were created within the same millisecond.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class IdBasedCursorPagination(BasePagination):
+    """
+    Keyset pagination. Rows are ordered by the view's `cursor_ordering`
+    (('-id',) by default, e.g. ('-created_at', '-id') for videos) and the
+    cursor stores those values for the boundary row, so any page is a range
+    scan on the ordering columns instead of an OFFSET.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.get_page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.get_page([row async for row in self.get_page_queryset(queryset, request, view)])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.setup(request, queryset.model, view)
+        return self.get_ordered(queryset, self.ordering, self.position)[:self.page_size + 1]
+
+    def setup(self, request, model, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = getattr(view, 'cursor_ordering', self.ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.position, self.reverse = self.decode_cursor(request, model)
+
+    def get_ordered(self, queryset, ordering, position):
+        if self.reverse:
+            ordering = [self.invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, position))
+        return queryset
+
+    def get_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_keyset_filter(self, ordering, position):
+        # (a, b) < (x, y) is written as a < x OR (a = x AND b < y) so each
+        # branch can use the composite index on the ordering columns.
+        keyset = Q()
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            branch = Q(**{f'{name}__{lookup}': position[i]})
+            for previous, value in zip(ordering[:i], position[:i]):
+                branch &= Q(**{previous.lstrip('-'): value})
+            keyset |= branch
+        return keyset
+
+    def invert(self, field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return [row[field] for field in self.fields]
+        return [getattr(row, field) for field in self.fields]
+
+    def get_cursor_data(self, row, reverse):
+        data = {'p': self.get_position(row)}
+        if reverse:
+            data['r'] = 1
+        return data
+
+    def encode_cursor(self, row, reverse):
+        data = self.get_cursor_data(row, reverse)
+        cursor = json.dumps(data, cls=CursorEncoder, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(cursor.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        cursor = request.GET.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position = self.get_cursor_position(data, model, self.fields)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(data.get('r'))
+
+    def get_cursor_position(self, data, model, fields):
+        values = data['p']
+        if len(values) != len(fields):
+            raise ValueError
+        return [
+            model._meta.get_field(field).to_python(value)
+            for field, value in zip(fields, values)
+        ]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class TrailingCursorPagination(IdBasedCursorPagination):
+    """
+    Keyset pagination over the view's queryset, continued by
+    `trailing_queryset` ordered by the view's `trailing_cursor_ordering`
+    once the first one runs out, e.g. raw watch history followed by its
+    older daily summaries. A page may hold rows of both; the cursor
+    records which queryset its boundary row came from.
+    """
+    trailing_ordering = ('-id',)
+
+    def __init__(self, trailing_queryset=None):
+        self.trailing_queryset = trailing_queryset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        first, second = self.get_page_querysets(queryset, request, view)
+        rows = list(first)
+        if second is not None and len(rows) <= self.page_size:
+            rows += list(second[:self.page_size - len(rows) + 1])
+        return self.get_page(rows)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        first, second = self.get_page_querysets(queryset, request, view)
+        rows = [row async for row in first]
+        if second is not None and len(rows) <= self.page_size:
+            rows += [row async for row in second[:self.page_size - len(rows) + 1]]
+        return self.get_page(rows)
+
+    def get_page_querysets(self, queryset, request, view=None):
+        # Forward from the leading queryset, or backward from the trailing
+        # one, a short page is filled up from the start of the other.
+        if self.trailing_queryset is None:
+            return self.get_page_queryset(queryset, request, view), None
+
+        self.trailing_ordering = getattr(view, 'trailing_cursor_ordering', self.trailing_ordering)
+        self.trailing_fields = [field.lstrip('-') for field in self.trailing_ordering]
+        self.trailing = False
+        self.setup(request, queryset.model, view)
+        leading, trailing = (queryset, self.ordering), (self.trailing_queryset, self.trailing_ordering)
+        if self.trailing:
+            leading, trailing = trailing, leading
+        first = self.get_ordered(*leading, self.position)[:self.page_size + 1]
+        if self.trailing != self.reverse:
+            return first, None
+        return first, self.get_ordered(*trailing, None)
+
+    def is_trailing(self, row):
+        return isinstance(row, self.trailing_queryset.model)
+
+    def get_position(self, row):
+        if self.trailing_queryset is not None and self.is_trailing(row):
+            return [getattr(row, field) for field in self.trailing_fields]
+        return super().get_position(row)
+
+    def get_cursor_data(self, row, reverse):
+        data = super().get_cursor_data(row, reverse)
+        if self.trailing_queryset is not None and self.is_trailing(row):
+            data['t'] = 1
+        return data
+
+    def get_cursor_position(self, data, model, fields):
+        if self.trailing_queryset is not None and data.get('t'):
+            self.trailing = True
+            return super().get_cursor_position(data, self.trailing_queryset.model, self.trailing_fields)
+        return super().get_cursor_position(data, model, fields)
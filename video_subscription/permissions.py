@@ -0,0 +1,13 @@
+from rest_framework.permissions import IsAuthenticated
+
+
+
+class HasVideoUser(IsAuthenticated):
+    """
+    Authenticated users with a VideoUser profile. Accounts without one,
+    e.g. staff created with createsuperuser, get a 403 instead of failing
+    on `request.user.videouser`.
+    """
+
+    def has_permission(self, request, view):
+        return super().has_permission(request, view) and hasattr(request.user, 'videouser')
@@ -0,0 +1,125 @@
+import math
+import os
+import struct
+import threading
+from array import array
+from collections import defaultdict
+from django.conf import settings
+from .models import Rate, WatchHistory, WatchHistoryDaily
+
+
+
+# Item-to-item recommendations. `build` computes cosine similarity between
+# videos from co-occurrence in user histories (watches and ratings of 3 or
+# more) and keeps the top neighbours of each video. They are stored on disk
+# as a CSR matrix of flat typed arrays and loaded into a dict of neighbour
+# lists, so a lookup is a few hundred additions.
+
+ARRAYS = (('videos', 'q'), ('indptr', 'q'), ('indices', 'q'), ('scores', 'f'))
+
+
+def get_histories(history_size):
+    # Up to `history_size` videos per user: the most recent watches, then
+    # rolled-up history, which is older than any raw row, then the most
+    # recent ratings of 3 or more.
+    histories = defaultdict(list)
+    seen = defaultdict(set)
+    sources = (
+        WatchHistory.objects.order_by('user', '-watched_at'),
+        WatchHistoryDaily.objects.order_by('user', '-date'),
+        Rate.objects.filter(rate__gte=3).order_by('user', '-created_at'),
+    )
+    for queryset in sources:
+        for user_id, video_id in queryset.values_list('user', 'video').iterator(chunk_size=10000):
+            history = histories[user_id]
+            if len(history) < history_size and video_id not in seen[user_id]:
+                history.append(video_id)
+                seen[user_id].add(video_id)
+    return histories.values()
+
+
+def build(neighbors=20, history_size=50):
+    occurrences = defaultdict(int)
+    pairs = defaultdict(lambda: defaultdict(int))
+    for history in get_histories(history_size):
+        for i, video_id in enumerate(history):
+            occurrences[video_id] += 1
+            row = pairs[video_id]
+            for other in history[:i]:
+                row[other] += 1
+                pairs[other][video_id] += 1
+
+    matrix = {name: array(typecode) for name, typecode in ARRAYS}
+    matrix['indptr'].append(0)
+    for video_id in sorted(pairs):
+        row = pairs[video_id]
+        scores = [
+            (count / math.sqrt(occurrences[video_id] * occurrences[other]), other)
+            for other, count in row.items()
+        ]
+        scores.sort(reverse=True)
+        matrix['videos'].append(video_id)
+        for score, other in scores[:neighbors]:
+            matrix['indices'].append(other)
+            matrix['scores'].append(score)
+        matrix['indptr'].append(len(matrix['indices']))
+    return matrix
+
+
+def save(matrix, path):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        for name, typecode in ARRAYS:
+            f.write(struct.pack('<q', len(matrix[name])))
+            matrix[name].tofile(f)
+    os.replace(tmp, path)
+
+
+def load(path):
+    matrix = {}
+    with open(path, 'rb') as f:
+        for name, typecode in ARRAYS:
+            length, = struct.unpack('<q', f.read(8))
+            matrix[name] = array(typecode)
+            matrix[name].fromfile(f, length)
+    return matrix
+
+
+class Recommender:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.rows = {}
+
+    def refresh(self):
+        # Reload when `build_recommendations` has written a new matrix.
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            self.rows, self.mtime = {}, None
+            return
+        if mtime == self.mtime:
+            return
+        with self.lock:
+            matrix = load(self.path)
+            indptr, indices, scores = matrix['indptr'], matrix['indices'], matrix['scores']
+            self.rows = {
+                video_id: list(zip(indices[indptr[i]:indptr[i + 1]], scores[indptr[i]:indptr[i + 1]]))
+                for i, video_id in enumerate(matrix['videos'])
+            }
+            self.mtime = mtime
+
+    def recommend(self, history, exclude=()):
+        """Candidate video ids for a watch history, best first."""
+        self.refresh()
+        candidates = defaultdict(float)
+        for video_id in history:
+            for other, score in self.rows.get(video_id, ()):
+                candidates[other] += score
+        for video_id in exclude:
+            candidates.pop(video_id, None)
+        return sorted(candidates, key=candidates.get, reverse=True)
+
+
+recommender = Recommender(getattr(settings, 'RECOMMENDATIONS_PATH', settings.BASE_DIR / 'recommendations.bin'))
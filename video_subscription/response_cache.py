@@ -0,0 +1,114 @@
+import functools
+import hashlib
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date
+from rest_framework.response import Response
+from .models import Comment, License, Rate, Video, VideoUser
+
+
+
+# Cached API responses. Each entry is tagged with the models its response
+# is built from; the key includes the current version of every tag, so a
+# save or delete of any instance of those models bumps the version and
+# orphans the entries instead of having to find and delete them.
+
+TAG_KEY = 'response-cache:tag:{}'
+ENTRY_KEY = 'response-cache:{}:{}'
+
+# Models that cached responses may be tagged with.
+TAGGED_MODELS = (User, VideoUser, License, Video, Comment, Rate)
+
+HEADERS = ('ETag', 'Last-Modified')
+
+stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def get_tag(model):
+    return TAG_KEY.format(model._meta.label_lower)
+
+
+def get_versions(models):
+    keys = [get_tag(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh version, not 0, so an evicted tag can't bring back
+            # entries stored under an earlier version.
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(model):
+    cache.set(get_tag(model), time.time_ns(), None)
+
+
+def cached_response(*models, per_user=True):
+    """
+    Cache a viewset method's 200 responses until one of `models` changes.
+    The key covers the endpoint, the full URL with its query and, unless
+    `per_user` is False, the requesting user.
+    """
+    for model in models:
+        if model not in TAGGED_MODELS:
+            raise ValueError(f'{model.__name__} is not in TAGGED_MODELS.')
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            endpoint = f'{self.basename}-{self.action}'
+            parts = [request.build_absolute_uri(), *get_versions(models)]
+            if per_user:
+                parts.append(request.user.pk)
+            digest = hashlib.md5(repr(parts).encode()).hexdigest()
+            key = ENTRY_KEY.format(endpoint, digest)
+
+            entry = cache.get(key)
+            if entry is not None:
+                stats[endpoint]['hits'] += 1
+                data, headers = entry
+                last_modified = headers.get('Last-Modified')
+                response = get_conditional_response(
+                    request, etag=headers.get('ETag'),
+                    last_modified=last_modified and parse_http_date(last_modified),
+                )
+                if response is None:
+                    response = Response(data)
+                for name, value in headers.items():
+                    response[name] = value
+                return response
+
+            stats[endpoint]['misses'] += 1
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                headers = {name: response[name] for name in HEADERS if name in response}
+                cache.set(key, (response.data, headers), getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate(sender, **kwargs):
+    bump(sender)
+
+
+for model in TAGGED_MODELS:
+    post_save.connect(invalidate, sender=model, dispatch_uid=f'response-cache-{model._meta.label_lower}')
+    post_delete.connect(invalidate, sender=model, dispatch_uid=f'response-cache-delete-{model._meta.label_lower}')
+
+
+def get_stats():
+    result = {}
+    for endpoint, counts in sorted(stats.items()):
+        lookups = counts['hits'] + counts['misses']
+        result[endpoint] = {
+            **counts,
+            'hit_ratio': counts['hits'] / lookups if lookups else 0.0,
+        }
+    return result
@@ -0,0 +1,88 @@
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Video
+
+
+
+# Full-text index over Video.title, description and category, stored in an
+# SQLite FTS5 table keyed by the video id and ranked with BM25. Other
+# database backends fall back to a LIKE scan.
+
+TABLE = 'video_subscription_video_fts'
+
+# BM25 column weights for title, description and category.
+WEIGHTS = (10.0, 1.0, 5.0)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def get_match_query(text):
+    # Quote every term so user input can't use FTS5 query syntax.
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in text.split()]
+    return ' '.join(terms)
+
+
+def index_video(video:Video):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [video.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, title, description, category) VALUES (%s, %s, %s, %s)',
+            [video.pk, video.title, video.description, video.category],
+        )
+
+
+def remove_video(video_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [video_id])
+
+
+def rebuild():
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, title, description, category) '
+            f'SELECT id, title, description, category FROM {Video._meta.db_table}'
+        )
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+def search(queryset, text, limit):
+    """
+    Videos from `queryset` matching `text`, best match first. The queryset
+    is applied as a subquery, so entitlement filters are evaluated inside
+    the same statement as the full-text match.
+    """
+    match = get_match_query(text)
+    if not match:
+        return []
+    if not is_available():
+        return list(queryset.filter(title__icontains=text)[:limit])
+
+    # `+rowid` keeps SQLite from pushing the id list into FTS5 as one
+    # lookup per id; the match runs once and is filtered against the set.
+    sql, params = queryset.values('pk').query.sql_with_params()
+    weights = ', '.join(map(str, WEIGHTS))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND +rowid IN ({sql}) '
+            f'ORDER BY bm25({TABLE}, {weights}) LIMIT %s',
+            [match, *params, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    videos = queryset.in_bulk(ids)
+    return [videos[pk] for pk in ids if pk in videos]
+
+
+@receiver(post_save, sender=Video)
+def update_search_index(sender, instance, **kwargs):
+    if is_available():
+        index_video(instance)
+
+
+@receiver(post_delete, sender=Video)
+def delete_from_search_index(sender, instance, **kwargs):
+    if is_available():
+        remove_video(instance.pk)
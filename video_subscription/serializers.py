@@ -2,7 +2,9 @@ from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 from .models import *
 from django.contrib.auth.models import User
-from django.db.models import Q
+from datetime import datetime
+from .entitlements import get_licensed_user_ids
+from .ledger import credit
 
 
 
@@ -87,6 +89,12 @@ class LicenseSerializer(serializers.HyperlinkedModelSerializer):
         fields = ['id', 'title', 'duration', 'price', 'url']
 
 
+class BulkPurchaseSerializer(serializers.Serializer):
+    licenses = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=100
+    )
+
+
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
@@ -99,10 +107,33 @@ class RateSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'video', 'created_at', 'rate']
 
 
+class RateSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RateSummary
+        fields = ['count', 'average', 'histogram']
+
+
+class WatchHistoryDailySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WatchHistoryDaily
+        fields = ['user', 'video', 'date', 'count']
+
+
+class WatchHistoryListSerializer(serializers.ListSerializer):
+    # History lists end with the daily summaries of rolled-up rows.
+    def to_representation(self, data):
+        daily = WatchHistoryDailySerializer(context=self.context)
+        return [
+            daily.to_representation(row) if isinstance(row, WatchHistoryDaily) else self.child.to_representation(row)
+            for row in data
+        ]
+
+
 class WatchHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = WatchHistory
-        fields = ['id', 'user', 'video', 'watched_at']
+        fields = ['id', 'user', 'video', 'watched_at', 'last_watched_at', 'count']
+        list_serializer_class = WatchHistoryListSerializer
 
 
 class AddBalanceSerializer(serializers.ModelSerializer):
@@ -110,11 +141,16 @@ class AddBalanceSerializer(serializers.ModelSerializer):
         model = VideoUser
         fields = ['id', 'balance']
 
+    def validate_balance(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('The amount must be positive.')
+        return value
+
     def create(self, validated_data):
         request = self.context.get('request')
         user = request.user.videouser
-        user.balance += validated_data['balance']
-        user.save()
+        credit(user, validated_data['balance'])
+        user.refresh_from_db(fields=['balance'])
 
         return user
 
@@ -135,12 +171,13 @@ class VideoUserReadOnlySerializer(serializers.HyperlinkedModelSerializer):
 
 class VideoSerializer(serializers.HyperlinkedModelSerializer):
     publisher = serializers.CharField(source='user.user.username', read_only=True)
+    average_rate = serializers.FloatField(source='rate_summary.average', read_only=True)
 
     class Meta:
         model = Video
         fields = [
             'id', 'publisher', 'title', 'description', 'file_url', 'category',
-            'created_at', 'updated_at', 'is_hide', 'url'
+            'created_at', 'updated_at', 'is_hide', 'average_rate', 'url'
         ]
         extra_kwargs = {
             'url': {'view_name':'video-detail'}
@@ -152,6 +189,7 @@ class SubscriptionSerializer(serializers.HyperlinkedModelSerializer):
     license_title = serializers.CharField(source='license.title', read_only=True)
     license_user  = serializers.CharField(source='license.user', read_only=True)
     username = serializers.CharField(source='user.user.username', read_only=True)
+    is_active = serializers.SerializerMethodField()
 
     class Meta:
         model = Subscription
@@ -164,6 +202,10 @@ class SubscriptionSerializer(serializers.HyperlinkedModelSerializer):
             'url': {'view_name':'subscription-detail'}
         }
 
+    def get_is_active(self, obj):
+        # The stored flag is only refreshed by `expire_subscriptions`.
+        return obj.end_date >= datetime.today().date()
+
 
     def validate_license(self, value):
         request = self.context.get('request')
@@ -172,23 +214,13 @@ class SubscriptionSerializer(serializers.HyperlinkedModelSerializer):
             raise serializers.ValidationError(
                 {'license': 'You cannot purchase your license.'}
             )
-        subscriptions = Subscription.objects.filter(
-            Q(user=user) &
-            Q(license__user=value.user)
-        )
-        if subscriptions.exists():
-            if subscriptions.first().is_active():
-                raise serializers.ValidationError(
-                    {'license': 'You already have an active license for this user.'}
-                )
-            else:
-                for sub in subscriptions:
-                    sub.delete()
-
+        if value.user_id in get_licensed_user_ids(user):
+            raise serializers.ValidationError(
+                {'license': 'You already have an active license for this user.'}
+            )
+        # The price is debited together with the insert in perform_create.
         if user.balance < value.price:
             raise serializers.ValidationError({'license': 'Insufficient balance.'})
-        user.balance -= value.price
-        user.save()
 
         return value
 
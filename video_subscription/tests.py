@@ -0,0 +1,807 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from .benchmarks import create_users, seed_catalog
+from .entitlements import get_licensed_user_ids, invalidate_entitlements
+from .fast_serializers import SubscriptionValuesSerializer, VideoValuesSerializer
+from .history import get_daily, rollup
+from .ledger import InsufficientBalance, bulk_purchase, debit
+from .models import (
+    BalanceEntry, Comment, License, Rate, RateSummary, Subscription, Video, VideoFacet, VideoUser,
+    WatchHistory, WatchHistoryDaily,
+)
+from .pagination import IdBasedCursorPagination
+from .recommendations import get_histories
+from .serializers import SubscriptionSerializer, VideoSerializer
+from .trending import Trending
+from .watch_buffer import WatchHistoryBuffer
+from .write_queue import WriteBehindQueue
+
+
+
+def create_user(username, balance=0):
+    user = User.objects.create(username=username)
+    return VideoUser.objects.create(user=user, phone='0', balance=balance)
+
+
+def get_client(user:VideoUser):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user.user).access_token}')
+    return client
+
+
+class VideoFeedQueriesTest(TestCase):
+    # The feed resolves the entitled publishers in one subquery, so its
+    # query count does not grow with the viewer's subscriptions.
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = create_user('viewer')
+        self.client = get_client(self.viewer)
+        self.licenses = []
+        for i in range(20):
+            publisher = create_user(f'publisher-{i}')
+            self.licenses.append(License.objects.create(user=publisher, title='license', duration=30))
+            Video.objects.create(user=publisher, title='video', description='', category='music')
+
+    def subscribe(self, licenses):
+        for license in licenses:
+            Subscription.objects.create(user=self.viewer, license=license, duration=license.duration)
+        invalidate_entitlements(self.viewer)
+
+    def test_one_subscription(self):
+        self.subscribe(self.licenses[:1])
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/videos/')
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_many_subscriptions(self):
+        self.subscribe(self.licenses[:1])
+        with self.assertNumQueries(4):
+            self.client.get('/api/videos/')
+
+        self.subscribe(self.licenses[1:])
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/videos/')
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class EntitlementInvalidationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = create_user('viewer')
+        self.publisher = create_user('publisher')
+        self.license = License.objects.create(user=self.publisher, title='license', duration=30)
+        Subscription.objects.create(user=self.viewer, license=self.license, duration=30)
+
+    def test_subscription_saved(self):
+        other = License.objects.create(user=create_user('other'), title='license', duration=30)
+        self.assertEqual(get_licensed_user_ids(self.viewer), [self.publisher.pk])
+        Subscription.objects.create(user=self.viewer, license=other, duration=30)
+        self.assertEqual(get_licensed_user_ids(self.viewer), [self.publisher.pk, other.user_id])
+
+    def test_license_deleted(self):
+        # Deleting the license removes its subscriptions by cascade.
+        self.assertEqual(get_licensed_user_ids(self.viewer), [self.publisher.pk])
+        response = get_client(self.publisher).delete(f'/api/manage/licenses/{self.license.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(get_licensed_user_ids(self.viewer), [])
+
+
+class ListQueriesTest(TestCase):
+    # Queries per list endpoint at the largest page size; the same for any
+    # number of rows as long as the serializers' relations are joined or
+    # prefetched.
+    page_size = IdBasedCursorPagination.max_page_size
+    queries = {
+        '/api/videos/': 4,
+        '/api/subscriptions/': 2,
+        '/api/users/': 3,
+        '/api/licenses/': 3,
+        '/api/watch-history/': 2,
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, rows):
+        viewer, = create_users(1, prefix='viewer-')
+        publishers = create_users(rows, prefix='publisher-')
+        License.objects.bulk_create([
+            License(user=publisher, title='license', duration=30) for publisher in publishers
+        ])
+        Video.objects.bulk_create([
+            Video(user=publisher, title='video', description='', category='music') for publisher in publishers
+        ])
+        Subscription.objects.bulk_create([
+            Subscription(user=viewer, license=license, duration=30, end_date=date.today() + timedelta(days=30))
+            for license in License.objects.filter(user__in=publishers)
+        ])
+        WatchHistory.objects.bulk_create([
+            WatchHistory(user=viewer, video=video) for video in Video.objects.filter(user__in=publishers)
+        ])
+        return viewer
+
+    def assert_queries(self, rows):
+        client = get_client(self.seed(rows))
+        for path, queries in self.queries.items():
+            if path == '/api/watch-history/' and rows <= self.page_size:
+                queries += 1  # the raw rows run out and the daily summaries follow
+            with self.subTest(path=path), self.assertNumQueries(queries):
+                response = client.get(path, {'page_size': self.page_size})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), min(rows, self.page_size))
+
+    def test_1_row(self):
+        self.assert_queries(1)
+
+    def test_10_rows(self):
+        self.assert_queries(10)
+
+    def test_1000_rows(self):
+        self.assert_queries(1000)
+
+
+class ConcurrentDebitTest(TransactionTestCase):
+    def test_balance_never_overdrawn(self):
+        user = create_user('buyer', balance=Decimal('5.00'))
+        succeeded = []
+        barrier = threading.Barrier(10)
+
+        def buy():
+            barrier.wait()
+            try:
+                for _ in range(100):
+                    try:
+                        debit(user, Decimal('1.00'), BalanceEntry.PURCHASE)
+                    except InsufficientBalance:
+                        return
+                    except OperationalError:
+                        # SQLite refuses a concurrent writer outright
+                        # instead of waiting; the debit failed as a whole.
+                        time.sleep(0.01)
+                    else:
+                        succeeded.append(True)
+                        return
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        user.refresh_from_db()
+        self.assertEqual(len(succeeded), 5)
+        self.assertEqual(user.balance, 0)
+        self.assertEqual(BalanceEntry.objects.filter(user=user).count(), 5)
+
+
+class BulkPurchaseTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buyer = create_user('buyer', balance=Decimal('10.00'))
+        self.licenses = [
+            License.objects.create(user=create_user(f'publisher-{i}'), title='license', duration=30, price=1)
+            for i in range(2)
+        ]
+        self.subscription = Subscription.objects.create(user=self.buyer, license=self.licenses[0], duration=30)
+
+    def test_purchase_and_renewal(self):
+        results = bulk_purchase(self.buyer, [license.pk for license in self.licenses])
+        self.assertEqual([result['status'] for result in results], ['renewed', 'purchased'])
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.duration, 60)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.balance, Decimal('8.00'))
+        entries = BalanceEntry.objects.filter(user=self.buyer).order_by('pk')
+        self.assertEqual(
+            [(entry.kind, entry.amount, entry.license_id) for entry in entries],
+            [
+                (BalanceEntry.RENEWAL, Decimal('-1.00'), self.licenses[0].pk),
+                (BalanceEntry.PURCHASE, Decimal('-1.00'), self.licenses[1].pk),
+            ],
+        )
+        self.assertEqual(get_licensed_user_ids(self.buyer), sorted(license.user_id for license in self.licenses))
+
+    def test_insufficient_balance(self):
+        VideoUser.objects.filter(pk=self.buyer.pk).update(balance=1)
+        results = bulk_purchase(self.buyer, [license.pk for license in self.licenses])
+        self.assertEqual({result['detail'] for result in results}, {'Insufficient balance.'})
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.duration, 30)
+        self.assertEqual(Subscription.objects.filter(user=self.buyer).count(), 1)
+        self.assertFalse(BalanceEntry.objects.filter(user=self.buyer).exists())
+
+
+class RecommendationHistoryTest(TestCase):
+    def test_ratings_capped_by_history_size(self):
+        viewer = create_user('viewer')
+        publisher = create_user('publisher')
+        videos = Video.objects.bulk_create([
+            Video(user=publisher, title='video', description='', category='music') for _ in range(5)
+        ])
+        WatchHistory.objects.create(user=viewer, video=videos[0])
+        Rate.objects.bulk_create([Rate(user=viewer, video=video, rate=5) for video in videos])
+        history, = get_histories(3)
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history[0], videos[0].pk)
+        self.assertEqual(len(set(history)), 3)
+
+
+class WatchHistoryListTest(TestCase):
+    # Rolled-up history follows the raw rows in the same cursor stream.
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = create_user('viewer')
+        publisher = create_user('publisher')
+        videos = Video.objects.bulk_create([
+            Video(user=publisher, title='video', description='', category='music') for _ in range(7)
+        ])
+        WatchHistory.objects.bulk_create([WatchHistory(user=self.viewer, video=video) for video in videos])
+        WatchHistoryDaily.objects.bulk_create([
+            WatchHistoryDaily(user=self.viewer, video=video, date=date.today() - timedelta(days=100 + i), count=2)
+            for i, video in enumerate(videos[:5])
+        ])
+        self.client = get_client(self.viewer)
+
+    def walk(self, path):
+        pages = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append(data)
+            path = data['next']
+        return pages
+
+    def test_forward_and_back(self):
+        pages = self.walk('/api/watch-history/?page_size=5')
+        self.assertEqual([len(page['results']) for page in pages], [5, 5, 2])
+        results = [row for page in pages for row in page['results']]
+        self.assertTrue(all('id' in row for row in results[:7]))
+        self.assertEqual(
+            [row['date'] for row in results[7:]],
+            [(date.today() - timedelta(days=100 + i)).isoformat() for i in range(5)],
+        )
+
+        previous = self.client.get(pages[2]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+        previous = self.client.get(previous['previous']).json()
+        self.assertEqual(previous['results'], pages[0]['results'])
+        self.assertIsNone(previous['previous'])
+
+    def test_async_view(self):
+        pages = self.walk('/api/async/watch-history/?page_size=5')
+        expected = self.walk('/api/watch-history/?page_size=5')
+        self.assertEqual([page['results'] for page in pages], [page['results'] for page in expected])
+
+
+class WatchHistoryBufferTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = create_user('viewer')
+        self.video = Video.objects.create(user=create_user('publisher'), title='video', description='', category='music')
+        self.buffer = WatchHistoryBuffer(max_size=100, flush_interval=60, session_window=1800)
+        self.buffer.start = lambda: None  # flushed by hand here
+
+    def test_buffered_until_flush(self):
+        self.buffer.add(self.viewer, self.video)
+        self.assertFalse(WatchHistory.objects.exists())
+        self.assertEqual(self.buffer.pending(self.video.pk), 1)
+
+        self.assertTrue(self.buffer.flush())
+        self.assertEqual(WatchHistory.objects.count(), 1)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.views_count, 1)
+        self.assertEqual(self.buffer.pending(self.video.pk), 0)
+
+    def test_refreshes_coalesced(self):
+        self.buffer.add(self.viewer, self.video)
+        self.buffer.add(self.viewer, self.video)
+        self.buffer.flush()
+        self.buffer.add(self.viewer, self.video)
+        self.buffer.flush()
+
+        watch, = WatchHistory.objects.all()
+        self.assertEqual(watch.count, 3)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.views_count, 1)
+
+    def test_deleted_video_dropped(self):
+        self.buffer.add(self.viewer, self.video)
+        self.video.delete()
+        self.assertTrue(self.buffer.flush())
+        self.assertFalse(WatchHistory.objects.exists())
+        self.assertEqual(self.buffer.pending(self.video.pk), 0)
+
+    def test_failed_flush_kept(self):
+        self.buffer.add(self.viewer, self.video)
+        with mock.patch.object(WatchHistory.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('video_subscription.watch_buffer', 'ERROR'):
+            self.assertFalse(self.buffer.flush())
+        self.assertFalse(WatchHistory.objects.exists())
+        self.assertEqual(self.buffer.pending(self.video.pk), 1)
+
+        self.buffer.add(self.viewer, self.video)
+        self.assertTrue(self.buffer.flush())
+        watch, = WatchHistory.objects.all()
+        self.assertEqual(watch.count, 2)
+
+
+    def test_sessions_survive_other_cache_entries(self):
+        buffer = WatchHistoryBuffer(max_size=100, flush_interval=60, session_window=1800, session_cache='watch-sessions')
+        buffer.start = lambda: None
+        caches['watch-sessions'].clear()
+        buffer.add(self.viewer, self.video)
+        for i in range(1000):
+            cache.set(f'filler-{i}', i)
+        buffer.add(self.viewer, self.video)
+        buffer.flush()
+        watch, = WatchHistory.objects.all()
+        self.assertEqual(watch.count, 2)
+
+
+class WatchHistoryRollupTest(TestCase):
+    def setUp(self):
+        self.viewer = create_user('viewer')
+        self.video = Video.objects.create(user=create_user('publisher'), title='video', description='', category='music')
+        self.watched_at = timezone.now() - timedelta(days=100)
+        # Two sessions, the first refreshed twice.
+        WatchHistory.objects.bulk_create([
+            WatchHistory(
+                user=self.viewer, video=self.video, watched_at=self.watched_at,
+                last_watched_at=self.watched_at + timedelta(minutes=10), count=3,
+            ),
+            WatchHistory(user=self.viewer, video=self.video, watched_at=self.watched_at, last_watched_at=self.watched_at),
+        ])
+
+    def test_rollup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(rollup(timezone.now() - timedelta(days=90), archive_dir=directory), 2)
+            path, = [os.path.join(directory, name) for name in os.listdir(directory)]
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                archived = [json.loads(line) for line in f]
+
+        self.assertFalse(WatchHistory.objects.exists())
+        daily, = WatchHistoryDaily.objects.all()
+        self.assertEqual((daily.count, daily.sessions), (4, 2))
+        self.assertEqual(sorted(row['count'] for row in archived), [1, 3])
+        self.assertEqual(
+            max(row['last_watched_at'] for row in archived),
+            (self.watched_at + timedelta(minutes=10)).isoformat(),
+        )
+
+        call_command('rebuild_view_counts', stdout=io.StringIO())
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.views_count, 2)
+
+    def test_daily_counts_refreshes(self):
+        WatchHistory.objects.update(watched_at=timezone.now())
+        self.assertEqual([row['count'] for row in get_daily(self.viewer, 1)], [4])
+
+
+class WatchHistoryBufferWorkerTest(TransactionTestCase):
+    def test_flushed_without_further_requests(self):
+        cache.clear()
+        viewer = create_user('viewer')
+        video = Video.objects.create(user=create_user('publisher'), title='video', description='', category='music')
+        buffer = WatchHistoryBuffer(max_size=100, flush_interval=0.05, session_window=1800)
+        buffer.add(viewer, video)
+        deadline = time.monotonic() + 5
+        while buffer.pending(video.pk) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(WatchHistory.objects.count(), 1)
+
+
+class RateSummaryRebuildTest(TestCase):
+    def test_rebuild_after_cascade(self):
+        publisher = create_user('publisher')
+        video = Video.objects.create(user=publisher, title='video', description='', category='music')
+        raters = [create_user(f'rater-{i}') for i in range(3)]
+        for rater, score in zip(raters, (1, 4, 5)):
+            Rate.objects.create(user=rater, video=video, rate=score)
+        RateSummary.add(video.pk, [1, 4, 5])
+
+        # Deleting a user removes their rates by cascade, not from the summary.
+        raters[0].user.delete()
+        summary = RateSummary.objects.get(video=video)
+        self.assertEqual(summary.count, 3)
+
+        call_command('rebuild_rate_summary', stdout=io.StringIO())
+        summary = RateSummary.objects.get(video=video)
+        self.assertEqual((summary.count, summary.total), (2, 9))
+        self.assertEqual(summary.histogram, {'0': 0, '1': 0, '2': 0, '3': 0, '4': 1, '5': 1})
+
+
+class SubscriptionRenewalTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = create_user('owner', balance=10)
+        license = License.objects.create(user=create_user('publisher'), title='license', duration=30, price=1)
+        self.subscription = Subscription.objects.create(user=self.owner, license=license, duration=30)
+
+    def test_renew_own(self):
+        response = get_client(self.owner).put(f'/api/subscriptions/{self.subscription.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.duration, 60)
+
+    def test_renew_other_users(self):
+        other = create_user('other', balance=10)
+        response = get_client(other).put(f'/api/subscriptions/{self.subscription.pk}/')
+        self.assertEqual(response.status_code, 404)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.duration, 30)
+        other.refresh_from_db()
+        self.assertEqual(other.balance, 10)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = create_user('viewer')
+        self.licenses = []
+        self.videos = []
+        for i in range(2):
+            publisher = create_user(f'publisher-{i}')
+            self.licenses.append(License.objects.create(user=publisher, title='license', duration=30))
+            self.videos.append(Video.objects.create(user=publisher, title='video', description='', category='music'))
+        Subscription.objects.create(user=self.viewer, license=self.licenses[1], duration=30)
+        self.client = get_client(self.viewer)
+        # Detail reads record a view; keep them out of the shared buffer.
+        patcher = mock.patch('video_subscription.viewsets.watch_buffer')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_list_not_modified(self):
+        response = self.client.get('/api/videos/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        response = self.client.get('/api/videos/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_subscription_added(self):
+        # The new publisher's video is older than everything in the feed.
+        Video.objects.filter(pk=self.videos[0].pk).update(updated_at=timezone.now() - timedelta(days=30))
+        response = self.client.get('/api/videos/')
+        etag = response['ETag']
+
+        Subscription.objects.create(user=self.viewer, license=self.licenses[0], duration=30)
+        response = self.client.get('/api/videos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get('/api/videos/', HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_not_modified(self):
+        path = f'/api/videos/{self.videos[1].pk}/'
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_detail_modified(self):
+        path = f'/api/videos/{self.videos[1].pk}/'
+        etag = self.client.get(path)['ETag']
+        Video.objects.filter(pk=self.videos[1].pk).update(title='renamed', updated_at=timezone.now() + timedelta(seconds=1))
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'renamed')
+
+
+class AsyncVideoDetailTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        viewer = create_user('viewer')
+        publisher = create_user('publisher')
+        license = License.objects.create(user=publisher, title='license', duration=30)
+        Subscription.objects.create(user=viewer, license=license, duration=30)
+        self.video = Video.objects.create(user=publisher, title='video', description='', category='music')
+        self.client = get_client(viewer)
+        patcher = mock.patch('video_subscription.async_views.watch_buffer')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_not_modified(self):
+        path = f'/api/async/videos/{self.video.pk}/'
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class WithoutVideoUserTest(TestCase):
+    # Accounts without a VideoUser, e.g. staff, are refused, not a 500.
+
+    def test_forbidden(self):
+        staff = User.objects.create(username='staff', is_staff=True)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(staff).access_token}')
+        for path in ('/api/videos/', '/api/videos/1/', '/api/watch-history/',
+                     '/api/async/videos/', '/api/async/videos/1/', '/api/async/watch-history/'):
+            with self.subTest(path=path):
+                self.assertEqual(client.get(path).status_code, 403)
+
+    def test_async_session(self):
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/api/async/videos/').status_code, 403)
+
+
+class FacetCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.publisher = create_user('publisher')
+        self.client = get_client(self.publisher)
+
+    def get_counts(self):
+        return dict(VideoFacet.objects.filter(user=self.publisher).values_list('category', 'count'))
+
+    def create(self, category='music'):
+        response = self.client.post('/api/manage/videos/', {
+            'title': 'video', 'description': 'text', 'category': category, 'is_hide': False,
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_create(self):
+        self.create()
+        self.create()
+        self.assertEqual(self.get_counts(), {'music': 2})
+
+    def test_hide(self):
+        pk = self.create()
+        self.client.patch(f'/api/manage/videos/{pk}/', {'is_hide': True})
+        self.assertEqual(self.get_counts(), {'music': 0})
+
+    def test_recategorize(self):
+        pk = self.create()
+        self.client.patch(f'/api/manage/videos/{pk}/', {'category': 'news'})
+        self.assertEqual(self.get_counts(), {'music': 0, 'news': 1})
+
+    def test_delete(self):
+        pk = self.create()
+        self.assertEqual(self.client.delete(f'/api/manage/videos/{pk}/').status_code, 204)
+        self.assertEqual(self.get_counts(), {'music': 0})
+
+    def test_video_created_elsewhere(self):
+        # No facet row exists for a video created outside the endpoint.
+        video = Video.objects.create(user=self.publisher, title='video', description='', category='music')
+        self.assertEqual(self.client.patch(f'/api/manage/videos/{video.pk}/', {'category': 'news'}).status_code, 200)
+        self.assertEqual(self.client.patch(f'/api/manage/videos/{video.pk}/', {'is_hide': True}).status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/manage/videos/{video.pk}/').status_code, 204)
+        self.assertEqual(self.get_counts(), {'news': 0})
+
+
+class TrendingTest(TestCase):
+    def setUp(self):
+        publisher = create_user('publisher')
+        self.video = Video.objects.create(user=publisher, title='video', description='', category='music')
+        self.trending = Trending(refresh_interval=3600)
+
+    def record(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.trending.lock, transaction.atomic():
+                self.trending.record([(self.video.pk, timezone.now())] * count)
+
+    def test_cold_load(self):
+        self.record(2)
+        self.assertEqual(self.trending.top('hour', 10), [(self.video.pk, 2)])
+
+    def test_record_after_load(self):
+        self.record(2)
+        self.trending.load()
+        self.record(3)
+        for window in ('hour', 'day', 'week'):
+            self.assertEqual(self.trending.top(window, 10), [(self.video.pk, 5)])
+        self.trending.load()
+        self.assertEqual(self.trending.top('hour', 10), [(self.video.pk, 5)])
+
+
+class TrendingLoadDuringFlushTest(TransactionTestCase):
+    def test_load_waits_for_flush(self):
+        publisher = create_user('publisher')
+        video = Video.objects.create(user=publisher, title='video', description='', category='music')
+        trending = Trending(refresh_interval=0)
+        trending.load()
+        recorded = threading.Event()
+
+        def flush():
+            try:
+                with trending.lock, transaction.atomic():
+                    trending.record([(video.pk, timezone.now())])
+                    recorded.set()
+                    time.sleep(0.2)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=flush)
+        thread.start()
+        recorded.wait()
+        # Reloads, since refresh_interval is 0, once the flush has committed
+        # and added its buckets to the old boards.
+        top = trending.top('hour', 10)
+        thread.join()
+        self.assertEqual(top, [(video.pk, 1)])
+        self.assertEqual(trending.top('hour', 10), [(video.pk, 1)])
+
+
+class SerializerParityTest(TestCase):
+    # The .values() serializers render byte for byte like the DRF ones,
+    # including null, unicode and expired values.
+
+    def setUp(self):
+        publisher = create_user('publisher')
+        viewer = create_user('viewer')
+        rated = Video.objects.create(user=publisher, title='video', description='', category='music')
+        Video.objects.create(
+            user=publisher, title='ویدیو "quoted"\n', description='text', category='news',
+            file_url='https://example.com/v.mp4?a=1&b=2', is_hide=True,
+        )
+        for i, rate in enumerate([5, 4, 4]):
+            Rate.objects.create(user=create_user(f'rater-{i}'), video=rated, rate=rate)
+        RateSummary.rebuild()
+
+        license = License.objects.create(user=publisher, title='license', duration=30)
+        Subscription.objects.create(user=viewer, license=license, duration=30)
+        expired = Subscription.objects.create(user=viewer, license=license, duration=30)
+        Subscription.objects.filter(pk=expired.pk).update(end_date=date.today() - timedelta(days=3))
+        self.context = {'request': Request(APIRequestFactory().get('/api/videos/')), 'format': None, 'view': None}
+
+    def assertRendersAlike(self, queryset, serializer_class, values_serializer_class):
+        renderer = JSONRenderer()
+        expected = renderer.render(serializer_class(list(queryset), many=True, context=self.context).data)
+        serializer = values_serializer_class(self.context)
+        self.assertEqual(renderer.render(serializer.serialize(queryset.values(*serializer.fields))), expected)
+
+    def test_videos(self):
+        queryset = Video.objects.select_related('user__user', 'rate_summary').order_by('-created_at', '-id')
+        self.assertRendersAlike(queryset, VideoSerializer, VideoValuesSerializer)
+
+    def test_subscriptions(self):
+        queryset = Subscription.objects.select_related('user__user', 'license__user__user').order_by('-id')
+        self.assertRendersAlike(queryset, SubscriptionSerializer, SubscriptionValuesSerializer)
+
+
+class ExportMemoryTest(TestCase):
+    # The comment export streams a chunk at a time, so its peak memory
+    # stays flat as the number of rows grows.
+
+    def setUp(self):
+        self.publisher = create_user('publisher')
+        self.video = Video.objects.create(user=self.publisher, title='video', description='', category='music')
+        self.client = get_client(self.publisher)
+
+    def export(self, rows):
+        Comment.objects.bulk_create(
+            [Comment(user=self.publisher, video=self.video, text=f'comment {i} ' * 5)
+             for i in range(Comment.objects.count(), rows)],
+            batch_size=1000,
+        )
+        tracemalloc.start()
+        try:
+            lines = 0
+            for chunk in self.client.get('/api/manage/videos/export_comments/').streaming_content:
+                lines += chunk.count(b'\n')
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(lines, rows)
+        return peak
+
+    def test_peak_memory_flat(self):
+        self.export(0)  # warms up URL resolving and auth
+        small = self.export(1000)
+        large = self.export(4000)
+        self.assertLess(large, small * 1.5)
+
+
+class WriteBehindQueueTest(TestCase):
+    def setUp(self):
+        self.publisher = create_user('publisher')
+        self.video = Video.objects.create(user=self.publisher, title='video', description='', category='music')
+        self.viewers = [create_user(f'viewer-{i}') for i in range(3)]
+        self.queue = WriteBehindQueue(enabled=True, max_size=10, batch_size=10, flush_interval=60, put_timeout=0.01)
+        self.queue.start = lambda: None  # flushed by hand here
+
+    def get_summary(self):
+        summary = RateSummary.objects.filter(video=self.video).first()
+        return (summary.count, summary.total) if summary else (0, 0)
+
+    def test_written_on_flush(self):
+        comment = Comment(user=self.viewers[0], video=self.video, text='text')
+        rate = Rate(user=self.viewers[0], video=self.video, rate=4)
+        self.queue.put(comment)
+        self.queue.put(rate)
+        time.sleep(0.01)
+        self.assertFalse(Comment.objects.exists())
+
+        self.queue.flush()
+        # Stamped when the request made them, not when they were written.
+        self.assertEqual(Comment.objects.get().created_at, comment.created_at)
+        self.assertEqual(Rate.objects.get().created_at, rate.created_at)
+        self.assertEqual(self.get_summary(), (1, 4))
+
+    def test_full_queue_writes_itself(self):
+        self.queue = WriteBehindQueue(enabled=True, max_size=1, batch_size=10, flush_interval=60, put_timeout=0.01)
+        self.queue.start = lambda: None
+        self.queue.put(Comment(user=self.viewers[0], video=self.video, text='queued'))
+        self.queue.put(Comment(user=self.viewers[1], video=self.video, text='written'))
+        self.assertEqual(list(Comment.objects.values_list('text', flat=True)), ['written'])
+        self.assertEqual(self.queue.stats['sync_writes'], 1)
+        self.queue.flush()
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_duplicates_and_deleted_videos_skipped(self):
+        other = Video.objects.create(user=self.publisher, title='video', description='', category='music')
+        Rate.objects.create(user=self.viewers[0], video=self.video, rate=1)
+        RateSummary.rebuild()
+        self.queue.put(Rate(user=self.viewers[0], video=self.video, rate=5))
+        self.queue.put(Rate(user=self.viewers[1], video=self.video, rate=5))
+        self.queue.put(Rate(user=self.viewers[1], video=self.video, rate=3))
+        self.queue.put(Rate(user=self.viewers[2], video=other, rate=5))
+        other.delete()
+        self.queue.flush()
+        self.assertEqual(self.get_summary(), (2, 6))
+        self.assertEqual(self.queue.stats['rates'], 1)
+        self.assertEqual(self.queue.stats['skipped'], 3)
+
+    def test_rate_written_elsewhere_not_counted(self):
+        self.queue.put(Rate(user=self.viewers[0], video=self.video, rate=5))
+        self.queue.put(Rate(user=self.viewers[1], video=self.video, rate=2))
+        bulk_create = Rate.objects.bulk_create
+
+        def race(rates, **kwargs):
+            # Another process rates between the duplicate check and the insert.
+            Rate.objects.create(user=self.viewers[0], video=self.video, rate=1)
+            return bulk_create(rates, **kwargs)
+
+        with mock.patch.object(Rate.objects, 'bulk_create', side_effect=race):
+            self.queue.flush()
+        self.assertEqual(Rate.objects.get(user=self.viewers[0]).rate, 1)
+        self.assertEqual(self.get_summary(), (1, 2))
+        self.assertEqual(self.queue.stats['rates'], 1)
+
+
+class BenchmarkSeedTest(TestCase):
+    def test_create_users_leaves_existing_accounts(self):
+        existing = User.objects.create(username='bench-admin')
+        users = create_users(2, prefix='bench-')
+        self.assertEqual([user.user.username for user in users], ['bench-0', 'bench-1'])
+        self.assertFalse(VideoUser.objects.filter(user=existing).exists())
+
+    def test_subscriptions_consistent(self):
+        seed_catalog(publishers=5, viewers=20, videos=1, subscriptions=3, watches=10, comments=0, rates=0, seed=1)
+        subscriptions = list(Subscription.objects.all())
+        self.assertEqual(len(subscriptions), 60)
+        for subscription in subscriptions:
+            self.assertEqual(subscription.end_date, subscription.start_date + timedelta(days=subscription.duration))
+            self.assertEqual(subscription.is_active, subscription.end_date >= date.today())
+        self.assertTrue(any(subscription.is_active for subscription in subscriptions))
+        self.assertFalse(all(subscription.is_active for subscription in subscriptions))
@@ -0,0 +1,150 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import VideoViewBucket
+
+
+
+# Time-bucketed view counters. Every flushed watch event is added to its
+# minute, hour and day bucket; the hour, day and week leaderboards are sums
+# over the last 60 minute, 24 hour and 7 day buckets, kept in memory and
+# rebuilt from the buckets on first use and every TRENDING_REFRESH_INTERVAL.
+# Writers hold `trending.lock` around the transaction that records events,
+# and loads hold it too, so a load either sees a flush's buckets or gets
+# them added afterwards, never both or neither.
+
+TRUNCATE = {
+    VideoViewBucket.MINUTE: lambda t: t.replace(second=0, microsecond=0),
+    VideoViewBucket.HOUR: lambda t: t.replace(minute=0, second=0, microsecond=0),
+    VideoViewBucket.DAY: lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+WINDOWS = {
+    'hour': (VideoViewBucket.MINUTE, timedelta(hours=1)),
+    'day': (VideoViewBucket.HOUR, timedelta(days=1)),
+    'week': (VideoViewBucket.DAY, timedelta(days=7)),
+}
+
+# How long buckets of each granularity are kept by `prune_view_buckets`.
+RETENTION = {
+    VideoViewBucket.MINUTE: timedelta(days=1),
+    VideoViewBucket.HOUR: timedelta(days=8),
+    VideoViewBucket.DAY: timedelta(days=90),
+}
+
+
+class Leaderboard:
+    """Sliding-window view counts over the buckets of one granularity."""
+
+    def __init__(self, granularity, span):
+        self.granularity = granularity
+        self.span = span
+        self.counts = Counter()
+        # Min-heap on bucket start, so late events still expire in order.
+        self.buckets = []
+
+    def add(self, start, video_id, count):
+        heapq.heappush(self.buckets, (start, video_id, count))
+        self.counts[video_id] += count
+
+    def expire(self, now):
+        # A bucket leaves the window once its whole interval is older than the span.
+        cutoff = TRUNCATE[self.granularity](now - self.span)
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            start, video_id, count = heapq.heappop(self.buckets)
+            self.counts[video_id] -= count
+            if self.counts[video_id] <= 0:
+                del self.counts[video_id]
+
+    def top(self, k, now):
+        self.expire(now)
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+
+class Trending:
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self.lock = threading.RLock()
+        self.boards = None
+        self.loaded_at = None
+
+    def load(self):
+        with self.lock:
+            now = timezone.now()
+            boards = {}
+            for window, (granularity, span) in WINDOWS.items():
+                board = boards[window] = Leaderboard(granularity, span)
+                rows = VideoViewBucket.objects.filter(
+                    granularity=granularity, start__gt=TRUNCATE[granularity](now - span)
+                ).values_list('start', 'video', 'count')
+                for start, video_id, count in rows.iterator(chunk_size=10000):
+                    board.add(start, video_id, count)
+            self.boards = boards
+            self.loaded_at = time.monotonic()
+
+    def get_boards(self):
+        with self.lock:
+            if self.boards is None or time.monotonic() - self.loaded_at >= self.refresh_interval:
+                self.load()
+            return self.boards
+
+    def record(self, events):
+        """
+        Add (video_id, watched_at) events to their buckets. Call inside the
+        transaction that stores the events, with `lock` held around that
+        transaction; the in-memory leaderboards are updated once it commits.
+        """
+        buckets = Counter()
+        for video_id, watched_at in events:
+            for granularity, truncate in TRUNCATE.items():
+                buckets[(video_id, granularity, truncate(watched_at))] += 1
+        if not buckets:
+            return
+
+        # One upsert per bucket instead of insert-then-update, so concurrent
+        # flushes add to the same row without losing counts.
+        table = VideoViewBucket._meta.db_table
+        start_field = VideoViewBucket._meta.get_field('start')
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} (video_id, granularity, start, count) VALUES (%s, %s, %s, %s) '
+                f'ON CONFLICT (video_id, granularity, start) DO UPDATE SET count = {table}.count + excluded.count',
+                [
+                    (video_id, granularity, start_field.get_db_prep_value(start, connection), count)
+                    for (video_id, granularity, start), count in buckets.items()
+                ],
+            )
+
+        transaction.on_commit(lambda: self.add_to_boards(buckets))
+
+    def add_to_boards(self, buckets):
+        with self.lock:
+            if self.boards is None:
+                return
+            for board in self.boards.values():
+                for (video_id, granularity, start), count in buckets.items():
+                    if granularity == board.granularity:
+                        board.add(start, video_id, count)
+
+    def top(self, window, k):
+        boards = self.get_boards()
+        with self.lock:
+            return boards[window].top(k, timezone.now())
+
+
+def prune(now=None):
+    now = now or timezone.now()
+    deleted = 0
+    for granularity, retention in RETENTION.items():
+        deleted += VideoViewBucket.objects.filter(
+            granularity=granularity, start__lt=now - retention
+        ).delete()[0]
+    return deleted
+
+
+trending = Trending(getattr(settings, 'TRENDING_REFRESH_INTERVAL', 60))
@@ -1,12 +1,17 @@
 from .models import VideoUser,License
 from rest_framework import generics
-from rest_framework.permissions import AllowAny,IsAuthenticated
+from rest_framework.permissions import AllowAny,IsAuthenticated,IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from .serializers import *
+from django.http import HttpResponse
+from . import entitlements, metrics, response_cache
+from .write_queue import write_queue
 
 
 
 class ProfileListView(generics.ListAPIView):
-    queryset = VideoUser.objects.all()
+    queryset = VideoUser.objects.select_related('user')
     serializer_class = VideoUserSerializer
     permission_classes = [IsAuthenticated]
 
@@ -15,7 +20,7 @@ class ProfileListView(generics.ListAPIView):
 
 
 class ProfileDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = VideoUser.objects.all()
+    queryset = VideoUser.objects.select_related('user')
     serializer_class = VideoUserSerializer
     permission_classes = [IsAuthenticated]
 
@@ -36,3 +41,21 @@ class ProfileAddBalanceView(generics.CreateAPIView):
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'entitlements': entitlements.get_stats(),
+            'responses': response_cache.get_stats(),
+            'write_queue': write_queue.get_stats(),
+        })
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
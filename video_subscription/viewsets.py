@@ -5,70 +5,304 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import VideoUser, Subscription, Video, License, WatchHistory
+from .models import VideoUser, Subscription, Video, License, WatchHistory, WatchHistoryDaily
 from .serializers import *
-from django.db.models import Q
-
-
-
-def get_licensed_users(user:VideoUser):
-    subscription_list = Subscription.objects.filter(user=user)
-    users = []
-    for sub in subscription_list:
-        if sub.is_active():
-            users.append(sub.license.user)
-    return users
+from .pagination import TrailingCursorPagination
+from .permissions import HasVideoUser
+from .fast_serializers import SubscriptionValuesSerializer, VideoValuesSerializer
+from django.db import IntegrityError, transaction
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, Max, Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+import hashlib
+from .entitlements import get_licensed_user_ids
+from .watch_buffer import buffer as watch_buffer
+from .write_queue import write_queue
+from .ledger import InsufficientBalance, bulk_purchase, debit
+from .search import search as search_videos
+from .facets import get_facets, video_added, video_changed, video_removed
+from .history import get_daily, get_recent_videos
+from .response_cache import cached_response
+from .exports import LAYOUTS, export_response
+from .recommendations import recommender
+from .trending import WINDOWS, trending
+
+
+
+class RelatedFieldsMixin:
+    """
+    Joins or prefetches the relations a viewset's serializer reads, so
+    list and detail views don't issue a query per row.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+
+class ValuesListMixin:
+    """
+    Lists through `values_serializer_class`, which renders `.values()` rows
+    to the same JSON as the viewset's serializer without building model
+    instances or reversing a URL per row.
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class(self.get_serializer_context())
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer.fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(queryset))
+
+
+class ConditionalMixin:
+    """
+    ETag / Last-Modified validators for list and detail reads, built from
+    the timestamps in `conditional_fields`. A matching If-None-Match or
+    If-Modified-Since is answered with 304 before anything is serialized.
+    Lists are validated by ETag only.
+    """
+    conditional_fields = ('updated_at',)
+
+    def get_etag_extra(self):
+        return ''
+
+    def get_validators(self, request, values, count=1, extra=None):
+        values = [value for value in values if value is not None]
+        last_modified = int(max(values).timestamp()) if values else None
+        key = '|'.join([
+            request.get_full_path(), str(count), self.get_etag_extra() if extra is None else extra,
+            *(value.isoformat() for value in values),
+        ])
+        return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest(), last_modified
+
+    def get_list_validators(self, request, queryset):
+        aggregates = queryset.aggregate(
+            count=Count('pk'),
+            **{f'last_{i}': Max(field) for i, field in enumerate(self.conditional_fields)}
+        )
+        count = aggregates.pop('count')
+        etag, last_modified = self.get_validators(request, aggregates.values(), count)
+        # Lists get no Last-Modified: rows leaving the list, or older rows
+        # joining it through a new subscription, don't move the newest
+        # timestamp. The ETag also covers the count and get_etag_extra().
+        return etag, None
+
+    def get_object_validators(self, request, obj, extra=None):
+        values = []
+        for field in self.conditional_fields:
+            value = obj
+            try:
+                for attr in field.split('__'):
+                    value = getattr(value, attr)
+            except ObjectDoesNotExist:
+                value = None
+            values.append(value)
+        return self.get_validators(request, values, extra=extra)
+
+    def get_not_modified(self, request, etag, last_modified):
+        response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.get_list_validators(request, queryset)
+        response = self.get_not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        return self.set_validators(super().list(request, *args, **kwargs), etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(request, instance)
+        response = self.get_not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(instance)
+        return self.set_validators(Response(serializer.data), etag, last_modified)
 
 
 class WatchHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Raw watch events, newest first. The list continues with the daily
+    summaries of rows older than WATCH_HISTORY_RETENTION_DAYS, which carry
+    a `date` instead of an `id` and timestamps.
+    """
     queryset = WatchHistory.objects.all()
     serializer_class = WatchHistorySerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [HasVideoUser]
+    pagination_class = TrailingCursorPagination
+    cursor_ordering = ('-watched_at', '-id')
+    trailing_cursor_ordering = ('-date', '-id')
 
     def get_queryset(self):
         user = self.request.user.videouser
+        watch_buffer.flush()
         return self.queryset.filter(user=user)
 
+    def paginate_queryset(self, queryset):
+        self.paginator.trailing_queryset = WatchHistoryDaily.objects.filter(user=self.request.user.videouser)
+        return super().paginate_queryset(queryset)
+
+    @action(detail=False, methods=['GET'])
+    def daily(self, request):
+        # Older history only survives as daily summaries, so per-day counts
+        # are the view that covers the whole retention period.
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except ValueError:
+            return Response({'days': 'Enter Integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        watch_buffer.flush()
+        return Response({'results': get_daily(request.user.videouser, days)})
 
-class VideoViewSet(viewsets.ReadOnlyModelViewSet):
+
+class VideoViewSet(ConditionalMixin, ValuesListMixin, RelatedFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
-    permission_classes = [IsAuthenticated]
+    values_serializer_class = VideoValuesSerializer
+    permission_classes = [HasVideoUser]
+    select_related_fields = ('user__user', 'rate_summary')
+    conditional_fields = ('updated_at', 'rate_summary__updated_at')
+    cursor_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         user = self.request.user.videouser
-        licensed_users = get_licensed_users(user)
+        licensed_users = get_licensed_user_ids(user)
         return self.queryset.filter(Q(user__in=licensed_users)&Q(is_hide=False))
 
+    def get_etag_extra(self):
+        # The feed also changes when the entitled publishers change.
+        return ','.join(map(str, get_licensed_user_ids(self.request.user.videouser)))
+
 
     def retrieve(self, request, pk=None):
         video = self.get_object()
         user = request.user.videouser
-        WatchHistory.objects.create(user=user, video=video)
+        watch_buffer.add(user, video)
+        etag, last_modified = self.get_object_validators(request, video)
+        response = self.get_not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
         serializer = self.get_serializer(video)
-        return Response(serializer.data)
+        return self.set_validators(Response(serializer.data), etag, last_modified)
+
+
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'q': 'please fill q parameter.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({'limit': 'Enter Integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        videos = search_videos(queryset, text, limit)
+        serializer = self.get_serializer(videos, many=True)
+        return Response({'results': serializer.data})
+
+
+    @action(detail=False, methods=['GET'])
+    def facets(self, request):
+        licensed_users = get_licensed_user_ids(request.user.videouser)
+        return Response(get_facets(licensed_users))
+
+
+    @action(detail=False, methods=['GET'])
+    def recommended(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'limit': 'Enter Integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user.videouser
+        history = get_recent_videos(user, 50)
+        candidates = recommender.recommend(dict.fromkeys(history), exclude=history)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        videos = queryset.in_bulk(candidates[:limit * 5])
+        results = [videos[pk] for pk in candidates[:limit * 5] if pk in videos][:limit]
+        if len(results) < limit:
+            # Cold start: fill up with the most viewed entitled videos.
+            results += list(
+                queryset.exclude(pk__in=[video.pk for video in results] + history)
+                .order_by('-views_count')[:limit - len(results)]
+            )
+        serializer = self.get_serializer(results, many=True)
+        return Response({'results': serializer.data})
+
+
+    @action(detail=False, methods=['GET'])
+    def trending(self, request):
+        window = request.query_params.get('window', 'day')
+        if window not in WINDOWS:
+            return Response({'window': f'Choose one of {", ".join(WINDOWS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'limit': 'Enter Integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        top = trending.top(window, limit * 5)
+        videos = self.filter_queryset(self.get_queryset()).in_bulk([video_id for video_id, views in top])
+        results = [
+            {'views': views, 'video': self.get_serializer(videos[video_id]).data}
+            for video_id, views in top if video_id in videos
+        ][:limit]
+        return Response({'window': window, 'results': results})
 
 
     @action(detail=True, methods=['GET'])
     def get_views(self, request, pk):
         video = get_object_or_404(Video, pk=pk)
-        views = WatchHistory.objects.filter(video=video).count()
+        views = video.views_count + watch_buffer.pending(video.pk)
         return Response({'views': views})
 
 
     @action(detail=True, methods=['GET'])
+    @cached_response(Video, Comment, per_user=False)
     def get_comments(self, request, pk):
         video = get_object_or_404(Video, pk=pk)
         comments = Comment.objects.filter(video=video)
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(comments)
+        serializer = CommentSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
     @action(detail=True, methods=['GET'])
+    @cached_response(Video, Rate, per_user=False)
     def get_rates(self, request, pk):
         video = get_object_or_404(Video, pk=pk)
         rates = Rate.objects.filter(video=video)
-        serializer = RateSerializer(rates, many=True)
+        page = self.paginate_queryset(rates)
+        serializer = RateSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+    @action(detail=True, methods=['GET'])
+    def get_rate_summary(self, request, pk):
+        summary = RateSummary.objects.filter(video_id=pk).first()
+        if summary is None:
+            get_object_or_404(Video, pk=pk)
+            summary = RateSummary(video_id=pk)
+        serializer = RateSummarySerializer(summary)
         return Response(serializer.data)
 
 
@@ -79,6 +313,11 @@ class VideoViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'text': 'please fill text field.'})
 
         user = request.user.videouser
+        if write_queue.enabled:
+            video_id = get_object_or_404(Video.objects.values_list('pk', flat=True), pk=pk)
+            write_queue.put(Comment(user=user, video_id=video_id, text=text))
+            return Response({'comment': 'The comment was registered.'})
+
         video = get_object_or_404(Video, pk=pk)
         Comment.objects.create(user=user, video=video, text=text)
 
@@ -99,68 +338,97 @@ class VideoViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'rate': 'Enter Integer.'})
 
         user = request.user.videouser
+        if write_queue.enabled:
+            video_id = get_object_or_404(Video.objects.values_list('pk', flat=True), pk=pk)
+            # Checked up front; a second rate still queued is dropped on flush.
+            if Rate.objects.filter(user=user, video_id=video_id).exists():
+                return Response({'rate': 'You have already rated this video.'})
+            write_queue.put(Rate(user=user, video_id=video_id, rate=rate))
+            return Response({'rate': 'The rate was registered.'})
+
         video = get_object_or_404(Video, pk=pk)
 
         try:
-            Rate.objects.create(user=user, video=video, rate=rate)
-        except:
+            with transaction.atomic():
+                Rate.objects.create(user=user, video=video, rate=rate)
+                RateSummary.add(video.pk, [rate])
+        except IntegrityError:
             return Response({'rate': 'You have already rated this video.'})
 
         return Response({'rate': 'The rate was registered.'})
 
 
 
-class LicenseViewSet(viewsets.ReadOnlyModelViewSet):
+class LicenseViewSet(ConditionalMixin, RelatedFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = License.objects.all()
     serializer_class = LicenseSerializer
     permission_classes = [IsAuthenticated]
+    # Caching the response pickles its hyperlinks, which reads str(license).
+    select_related_fields = ('user__user',)
 
     def get_queryset(self):
         user = self.request.user
         return self.queryset.exclude(user__user__username=user.username)
 
+    @cached_response(License)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     @action(detail=True, methods=['POST'])
     def buy_license(self, request, pk):
         user = request.user.videouser
         license = get_object_or_404(License, pk=pk)
         if user == license.user:
             return Response({'license': 'You cannot purchase your license.'})
-        subscriptions = Subscription.objects.filter(
-            Q(user=user) &
-            Q(license__user=license.user)
-        )
-        if subscriptions.exists():
-            if subscriptions.first().is_active():
-                return Response({'license': 'You already have an active license for this user.'})
-            else:
-                for sub in subscriptions:
-                    sub.delete()
-
-        if user.balance < license.price:
-            raise serializers.ValidationError({'license': 'Insufficient balance.'})
-        user.balance -= license.price
-        user.save()
+        if license.user_id in get_licensed_user_ids(user):
+            return Response({'license': 'You already have an active license for this user.'})
 
-        sub = Subscription.objects.create(user=user, license=license, duration=license.duration)
+        try:
+            with transaction.atomic():
+                debit(user, license.price, BalanceEntry.PURCHASE, license)
+                Subscription.objects.filter(
+                    Q(user=user) &
+                    Q(license__user=license.user)
+                ).delete()
+                sub = Subscription.objects.create(user=user, license=license, duration=license.duration)
+        except InsufficientBalance:
+            raise serializers.ValidationError({'license': 'Insufficient balance.'})
 
         return Response({'license': 'The license was successfully purchased.'})
 
 
+    @action(detail=False, methods=['POST'])
+    def bulk_buy(self, request):
+        serializer = BulkPurchaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user.videouser
+        results = bulk_purchase(user, serializer.validated_data['licenses'])
+        return Response({'results': results})
+
 
-class VideoUserViewSet(viewsets.ReadOnlyModelViewSet):
+
+class VideoUserViewSet(RelatedFieldsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = VideoUser.objects.all()
     serializer_class = VideoUserReadOnlySerializer
     permission_classes = [IsAuthenticated]
+    select_related_fields = ('user',)
+    prefetch_related_fields = ('licenses',)
 
     def get_queryset(self):
         user = self.request.user
         return self.queryset.exclude(user__username=user.username)
 
+    @cached_response(User, VideoUser, License)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
-class SubscriptionViewSet(viewsets.ModelViewSet):
+class SubscriptionViewSet(ValuesListMixin, RelatedFieldsMixin, viewsets.ModelViewSet):
     queryset = Subscription.objects.all()
     serializer_class = SubscriptionSerializer
+    values_serializer_class = SubscriptionValuesSerializer
     permission_classes = [IsAuthenticated]
+    select_related_fields = ('user__user', 'license__user__user')
 
 
     def get_serializer_context(self):
@@ -172,27 +440,30 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
         return self.queryset.filter(user__user=self.request.user)
 
     def perform_create(self, serializer):
+        user = self.request.user.videouser
         license = serializer.validated_data['license']
-        serializer.save(user=self.request.user.videouser, duration=license.duration)
-
-    def destroy(self, request, *args, **kwargs):
-        instance = self.get_object()
-        self.perform_destroy(instance)
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        try:
+            with transaction.atomic():
+                debit(user, license.price, BalanceEntry.PURCHASE, license)
+                Subscription.objects.filter(
+                    Q(user=user) &
+                    Q(license__user=license.user)
+                ).delete()
+                serializer.save(user=user, duration=license.duration)
+        except InsufficientBalance:
+            raise serializers.ValidationError({'license': 'Insufficient balance.'})
 
     def update(self, request, pk=None):
         try:
-            subscription = Subscription.objects.get(pk=pk)
-
             user = self.request.user.videouser
-            if user.balance < subscription.license.price:
-                return Response({'detail': 'Insufficient balance.'}, status=status.HTTP_400_BAD_REQUEST)
-            user.balance -= subscription.license.price
-            user.save()
-
-            subscription.duration += subscription.license.duration
-            subscription.save()
+            with transaction.atomic():
+                subscription = Subscription.objects.select_for_update().select_related('license').get(pk=pk, user=user)
+                debit(user, subscription.license.price, BalanceEntry.RENEWAL, subscription.license)
+                subscription.duration += subscription.license.duration
+                subscription.save()
             return Response({"status": "Subscription renewed"}, status=status.HTTP_200_OK)
+        except InsufficientBalance:
+            return Response({'detail': 'Insufficient balance.'}, status=status.HTTP_400_BAD_REQUEST)
         except Subscription.DoesNotExist:
             return Response({"error": "Subscription not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -200,19 +471,72 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
         raise PermissionDenied("You are not allowed to edit this subscription.")
 
 
-class ManageVideoViewSet(viewsets.ModelViewSet):
+class ExportMixin:
+    """
+    `export` streams all of the publisher's rows as NDJSON, or as one JSON
+    array with ?layout=array.
+    """
+    export_fields = ()
+    export_filename = 'export'
+
+    def get_export_response(self, queryset, fields, filename):
+        layout = self.request.query_params.get('layout', 'ndjson')
+        if layout not in LAYOUTS:
+            return Response({'layout': f'Choose one of {", ".join(LAYOUTS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(queryset.order_by('pk'), fields, filename, layout)
+
+    @action(detail=False, methods=['GET'])
+    def export(self, request):
+        return self.get_export_response(self.get_queryset(), self.export_fields, self.export_filename)
+
+
+class ManageVideoViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Video.objects.all()
     serializer_class = ManageVideoSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-created_at', '-id')
+    export_fields = (
+        'id', 'title', 'description', 'file_url', 'category',
+        'created_at', 'updated_at', 'is_hide', 'views_count',
+    )
+    export_filename = 'videos'
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user.videouser)
 
+    @action(detail=False, methods=['GET'])
+    def export_comments(self, request):
+        comments = Comment.objects.filter(video__user=request.user.videouser)
+        return self.get_export_response(comments, ('id', 'video', 'user', 'created_at', 'text'), 'comments')
+
+    @action(detail=False, methods=['GET'])
+    def export_rates(self, request):
+        rates = Rate.objects.filter(video__user=request.user.videouser)
+        return self.get_export_response(rates, ('id', 'video', 'user', 'created_at', 'rate'), 'rates')
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        video = serializer.save(user=self.request.user.videouser)
+        video_added(video)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        category, is_hide = serializer.instance.category, serializer.instance.is_hide
+        video = serializer.save()
+        video_changed(category, is_hide, video)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        video_removed(instance)
+        instance.delete()
+
 
-class ManageLicenseViewSet(viewsets.ModelViewSet):
+class ManageLicenseViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = License.objects.all()
     serializer_class = ManageLicenseSerializer
     permission_classes = [IsAuthenticated]
+    export_fields = ('id', 'title', 'duration', 'price', 'updated_at')
+    export_filename = 'licenses'
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user.videouser)
@@ -0,0 +1,170 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Video, VideoUser, WatchHistory
+from .trending import trending
+
+
+
+logger = logging.getLogger(__name__)
+
+
+class WatchHistoryBuffer:
+    """
+    Collects watch events in process and writes them with one bulk_create
+    once `max_size` events are pending or `flush_interval` seconds passed
+    since the last flush. A worker thread does the writing, so a quiet
+    server still flushes and a failed write is logged and retried with the
+    next flush instead of failing a request. Video.views_count is
+    incremented in the same transaction, so reading the views of a video
+    never scans WatchHistory.
+
+    Views within `session_window` seconds of the previous view of the same
+    video by the same user are refreshes of one session. A key per (user,
+    video) in the `session_cache` tells them apart without a query;
+    refreshes update the session's row and are not counted as views.
+    """
+
+    def __init__(self, max_size, flush_interval, session_window, session_cache='default'):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.session_window = session_window
+        self.session_cache = session_cache
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.events = []
+        self.sessions = {}
+        self.refreshes = {}
+        self.pending_views = Counter()
+        self.last_flush = time.monotonic()
+        self.wake = threading.Event()
+        self.worker = None
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name='watch-history-buffer', daemon=True)
+                self.worker.start()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            if self.is_due():
+                close_old_connections()
+                self.flush()
+                close_old_connections()
+
+    def is_due(self):
+        with self.lock:
+            pending = len(self.events) + len(self.refreshes)
+            return pending and (
+                pending >= self.max_size or
+                time.monotonic() - self.last_flush >= self.flush_interval
+            )
+
+    def add(self, user, video):
+        self.start()
+        now = timezone.now()
+        key = (user.pk, video.pk)
+        session_key = 'watch-session:{}:{}'.format(*key)
+        # cache.add is atomic within one cache, so only processes sharing the
+        # session cache (not LocMemCache) are kept from both opening the session.
+        sessions = caches[self.session_cache]
+        new_session = sessions.add(session_key, 1, self.session_window)
+        if not new_session:
+            sessions.touch(session_key, self.session_window)
+
+        with self.lock:
+            if new_session:
+                event = WatchHistory(user=user, video=video, watched_at=now, last_watched_at=now)
+                self.events.append(event)
+                self.sessions[key] = event
+                self.pending_views[video.pk] += 1
+            elif key in self.sessions:
+                # The session's row is still buffered.
+                self.sessions[key].last_watched_at = now
+                self.sessions[key].count += 1
+            else:
+                refresh = self.refreshes.setdefault(key, [now, 0])
+                refresh[0] = now
+                refresh[1] += 1
+            full = len(self.events) + len(self.refreshes) >= self.max_size
+        if full:
+            self.wake.set()
+
+    def pending(self, video_id):
+        # Views recorded by this process that are not written yet.
+        with self.lock:
+            return self.pending_views[video_id]
+
+    def flush(self):
+        """
+        Write everything buffered so far. Returns False when the write
+        failed; the events are then buffered again for the next flush.
+        """
+        with self.flush_lock:
+            with self.lock:
+                events, self.events = self.events, []
+                refreshes, self.refreshes = self.refreshes, {}
+                self.sessions = {}
+                views = Counter(self.pending_views)
+                self.last_flush = time.monotonic()
+            if not events and not refreshes:
+                return True
+
+            try:
+                self.write(events, refreshes, views)
+            except Exception:
+                logger.exception('Writing %d buffered watch events failed, keeping them for the next flush.', len(events))
+                self.requeue(events, refreshes)
+                return False
+
+            with self.lock:
+                self.pending_views.subtract(views)
+                self.pending_views += Counter()  # drops videos with nothing pending
+            return True
+
+    def write(self, events, refreshes, views):
+        # trending.lock spans the commit, see trending.py.
+        with trending.lock, transaction.atomic():
+            # Events of videos or users deleted while they were buffered are dropped.
+            existing = set(Video.objects.filter(pk__in=views).values_list('pk', flat=True))
+            users = set(VideoUser.objects.filter(pk__in={event.user_id for event in events}).values_list('pk', flat=True))
+            events = [event for event in events if event.video_id in existing and event.user_id in users]
+            WatchHistory.objects.bulk_create(events)
+            trending.record([(event.video_id, event.watched_at) for event in events])
+            for video_id, count in Counter(event.video_id for event in events).items():
+                Video.objects.filter(pk=video_id).update(views_count=F('views_count') + count)
+            for (user_id, video_id), (last_watched_at, count) in refreshes.items():
+                latest = WatchHistory.objects.filter(user=user_id, video=video_id).order_by('-watched_at', '-id')
+                WatchHistory.objects.filter(pk__in=latest.values('pk')[:1]).update(
+                    last_watched_at=last_watched_at, count=F('count') + count
+                )
+
+    def requeue(self, events, refreshes):
+        # Put a failed batch back in front of what was buffered meanwhile.
+        with self.lock:
+            self.events = events + self.events
+            for event in events:
+                self.sessions.setdefault((event.user_id, event.video_id), event)
+            for key, (last_watched_at, count) in refreshes.items():
+                refresh = self.refreshes.setdefault(key, [last_watched_at, 0])
+                refresh[0] = max(refresh[0], last_watched_at)
+                refresh[1] += count
+
+
+buffer = WatchHistoryBuffer(
+    getattr(settings, 'WATCH_HISTORY_BUFFER_SIZE', 100),
+    getattr(settings, 'WATCH_HISTORY_FLUSH_INTERVAL', 5),
+    getattr(settings, 'WATCH_SESSION_WINDOW', 30 * 60),
+    'watch-sessions' if 'watch-sessions' in settings.CACHES else 'default',
+)
+atexit.register(buffer.flush)
@@ -0,0 +1,177 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .models import Comment, Rate, RateSummary, Video
+from . import response_cache
+
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Optional write-behind for comments and rates. Requests put unsaved
+    instances on a bounded queue and a worker thread writes them in
+    batches with bulk_create. When the queue is full a request waits up to
+    `put_timeout` seconds and then writes its row itself, so a slow
+    database slows requests down instead of dropping writes.
+    """
+
+    def __init__(self, enabled, max_size, batch_size, flush_interval, put_timeout):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(max_size)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.worker = None
+        self.stats = Counter()
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name='write-behind', daemon=True)
+                self.worker.start()
+
+    def put(self, obj):
+        self.start()
+        try:
+            self.queue.put_nowait(obj)
+        except queue.Full:
+            self.stats['full'] += 1
+            start = time.monotonic()
+            try:
+                self.queue.put(obj, timeout=self.put_timeout)
+            except queue.Full:
+                self.stats['sync_writes'] += 1
+                self.write([obj])
+                return
+            finally:
+                self.stats['wait_ms'] += int((time.monotonic() - start) * 1000)
+        self.stats['enqueued'] += 1
+
+    def take(self, block):
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=self.flush_interval) if block else self.queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def done(self, batch):
+        for _ in batch:
+            self.queue.task_done()
+
+    def run(self):
+        while True:
+            batch = self.take(block=True)
+            if batch:
+                close_old_connections()
+                self.write(batch)
+                close_old_connections()
+                self.done(batch)
+
+    def flush(self):
+        """
+        Write everything queued so far on the calling thread and wait for
+        the batch the worker may be writing, so nothing is lost on exit.
+        """
+        while True:
+            batch = self.take(block=False)
+            if not batch:
+                break
+            self.write(batch)
+            self.done(batch)
+        self.queue.join()
+
+    def write(self, batch):
+        with self.flush_lock:
+            start = time.monotonic()
+            try:
+                with transaction.atomic():
+                    self.write_batch(batch)
+            except Exception:
+                # One bad row must not take the batch down with it.
+                logger.exception('Write-behind batch of %d rows failed, retrying one by one.', len(batch))
+                self.stats['failed_batches'] += 1
+                for obj in batch:
+                    try:
+                        with transaction.atomic():
+                            self.write_batch([obj])
+                    except Exception:
+                        logger.exception('Write-behind dropped %r.', obj)
+                        self.stats['dropped'] += 1
+            self.stats['batches'] += 1
+            self.stats['flush_ms'] += int((time.monotonic() - start) * 1000)
+
+    def write_batch(self, batch):
+        # Rows for videos deleted while they were queued are dropped.
+        existing = set(Video.objects.filter(pk__in={obj.video_id for obj in batch}).values_list('pk', flat=True))
+        comments = [obj for obj in batch if isinstance(obj, Comment) and obj.video_id in existing]
+        rates = {}
+        for obj in batch:
+            if isinstance(obj, Rate) and obj.video_id in existing:
+                rates.setdefault((obj.user_id, obj.video_id), obj)
+        for key in self.get_rated(rates):
+            rates.pop(key, None)
+        rates = list(rates.values())
+
+        Comment.objects.bulk_create(comments)
+        if rates:
+            # A rate another process wrote since the check above wins the
+            # conflict and is counted by that process, so only the rows read
+            # back with the created_at stamped here go into the summaries.
+            Rate.objects.bulk_create(rates, ignore_conflicts=True)
+            inserted = self.get_rated({(rate.user_id, rate.video_id): rate for rate in rates})
+            rates = [rate for rate in rates if inserted.get((rate.user_id, rate.video_id)) == rate.created_at]
+        scores = {}
+        for rate in rates:
+            scores.setdefault(rate.video_id, []).append(rate.rate)
+        for video_id, video_rates in scores.items():
+            RateSummary.add(video_id, video_rates)
+
+        # bulk_create sends no signals.
+        if comments:
+            transaction.on_commit(lambda: response_cache.bump(Comment))
+        if rates:
+            transaction.on_commit(lambda: response_cache.bump(Rate))
+        self.stats['comments'] += len(comments)
+        self.stats['rates'] += len(rates)
+        self.stats['skipped'] += len(batch) - len(comments) - len(rates)
+
+    def get_rated(self, rates):
+        # {(user_id, video_id): created_at} of the stored rates among the keys of `rates`.
+        if not rates:
+            return {}
+        rated = Rate.objects.filter(
+            user__in={user_id for user_id, video_id in rates},
+            video__in={video_id for user_id, video_id in rates},
+        ).values_list('user', 'video', 'created_at')
+        return {(user_id, video_id): created_at for user_id, video_id, created_at in rated if (user_id, video_id) in rates}
+
+    def get_stats(self):
+        return {
+            'enabled': self.enabled,
+            'queued': self.queue.qsize(),
+            'max_size': self.queue.maxsize,
+            **self.stats,
+        }
+
+
+write_queue = WriteBehindQueue(
+    getattr(settings, 'WRITE_BEHIND_ENABLED', False),
+    getattr(settings, 'WRITE_BEHIND_QUEUE_SIZE', 10000),
+    getattr(settings, 'WRITE_BEHIND_BATCH_SIZE', 500),
+    getattr(settings, 'WRITE_BEHIND_FLUSH_INTERVAL', 1),
+    getattr(settings, 'WRITE_BEHIND_PUT_TIMEOUT', 0.5),
+)
+atexit.register(write_queue.flush)